@@ -0,0 +1,119 @@
+# batch mode: update groups for many class sections at once
+#   each class directory (e.g. astr101/) is handled end to end, as in an
+#   interactive run: roster, prior conferences, homework, mcmc, and both
+#   output files
+#   sections are independent, so they run concurrently in a process pool
+#   each section's printed output is kept and shown only with --verbose
+# usage:
+#   python batch.py astr101/ astr102/ astr103/ --processes 4
+#   python batch.py astr*/ --method annealing --mcmc-depth 2e5 --seed 1
+#   any option not listed below is passed on to the script's own options
+
+import os
+import io
+import sys
+import time
+import random
+import argparse
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from replica_pool import fork_available
+from class_files import find_class_files
+
+# class name from a class directory, e.g. "astr101/" -> "101"
+def class_name(directory):
+    name = os.path.basename(os.path.normpath(directory))
+    if (name.startswith("astr")):
+        name = name[len("astr"):]
+    return name
+
+# update one section; runs in a worker process
+#   returns (directory, final penalty or None, wall time, printed output)
+def run_section(method, directory, solver_args):
+    if (method == "annealing"):
+        import conference_annealing_sp20 as script
+    else:
+        import conference_tempering_sp22 as script
+    userclass = class_name(directory)
+    rosterpath = directory
+    if (not (rosterpath.endswith("/"))): # append "/" to path if necessary
+        rosterpath = rosterpath + "/"
+    rosterfile = rosterpath + "astr" + userclass + "_roster_conferences_csv.csv"
+    classfiles = find_class_files(rosterpath, userclass) # listed once
+    options = script.parse_arguments([userclass, "--headless"] + solver_args)
+    if (options.rostername is not None):
+        rosterfile = rosterpath + options.rostername
+    if (options.seed is not None):
+        random.seed(options.seed)
+    else:
+        random.seed() # workers must not share the parent's random stream
+    output = io.StringIO()
+    start_time = time.perf_counter()
+    with redirect_stdout(output):
+        try:
+            final_penalty = script.update_class(userclass, rosterpath,
+                                                rosterfile, options,
+                                                classfiles)
+        except Exception as error:
+            print("Error updating groups: {:s}".format(repr(error)))
+            final_penalty = None
+    wall_time = time.perf_counter() - start_time
+    return (directory, final_penalty, wall_time, output.getvalue())
+
+# update all sections, in up to n_processes worker processes
+#   returns list of run_section results, in directory order
+def run_batch(method, directories, solver_args, n_processes=None):
+    if (n_processes is None):
+        n_processes = multiprocessing.cpu_count()
+    n_processes = max(1, min(n_processes, len(directories)))
+    if ((n_processes == 1) or (not fork_available())):
+        return [run_section(method, directory, solver_args)
+                for directory in directories]
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=n_processes,
+                             mp_context=context) as executor:
+        futures = [executor.submit(run_section, method, directory,
+                                   solver_args)
+                   for directory in directories]
+        return [future.result() for future in futures]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update conference groups "
+                                     "for many class sections at once.")
+    parser.add_argument("directories", nargs="+",
+                        help="class directories, e.g. astr101/")
+    parser.add_argument("--method", choices=["annealing", "tempering"],
+                        default="tempering",
+                        help="conference_annealing_sp20 or "
+                        "conference_tempering_sp22")
+    parser.add_argument("--processes", type=int,
+                        help="sections run at once (default: cpu count)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show each section's output")
+    options, solver_args = parser.parse_known_args(argv)
+    start_time = time.perf_counter()
+    results = run_batch(options.method, options.directories, solver_args,
+                        options.processes)
+    total_time = time.perf_counter() - start_time
+    n_failed = 0
+    for directory, final_penalty, wall_time, output in results:
+        if (options.verbose):
+            print(output, end="")
+        if (final_penalty is None):
+            n_failed = n_failed + 1
+            penalty_str = "not written"
+        else:
+            penalty_str = "penalty {:d}".format(final_penalty)
+        print("{:s} {:s} in {:.1f} s".format(directory.ljust(24),
+                                             penalty_str.ljust(20),
+                                             wall_time))
+    print("{:d} of {:d} sections updated in {:.1f} s.".format(len(results) - n_failed,
+                                                             len(results),
+                                                             total_time))
+    if (n_failed > 0):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+# benchmark suite for both solvers, on synthetic classes
+#   for each class size and solver, over a fixed set of seeds, reports:
+#     proposals/s: mcmc proposals scored per second by the solver's inner
+#     loop (python anneal() or numpy MultiChain), on that class's groups,
+#     with the early stops turned off so every proposal is counted
+#     time to bound: seconds from calling updategroups until the presolve
+#     lower bound (see presolve.py) was first reached, and in how many runs
+#     that happened; both solvers stop there, so this is when a run had
+#     nothing left to find
+#     final penalty: min, median and max over the seeds, scored with
+#     mcmc_penalty on the groups updategroups returned
+#   classes come from synthetic_class.py and are read the same way as in
+#   update_class (creating groups for the next conference)
+#   a run that raises is counted as failed, not stopped
+# usage:
+#   python benchmark.py --students 20 100 500 --seeds 5
+#   python benchmark.py --solvers annealing-numpy --jsonl results.jsonl
+
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from contextlib import redirect_stdout
+import conference_annealing_sp20 as annealing
+import conference_tempering_sp22 as tempering
+from best_state import BestState
+from class_files import excluded_string, excluded_mask
+from conference_history import ConferenceHistory
+from group_scoring import build_question_table
+from multichain import MultiChain
+from prior_associations import build_associations
+from synthetic_class import make_class
+
+solver_names = ["annealing", "annealing-numpy", "tempering",
+                "tempering-numpy"]
+
+# best state that also notes when the lower bound was first reached
+#   the bound is set by updategroups (from presolve) before the mcmc
+class TimedBest(BestState):
+    def __init__(self):
+        BestState.__init__(self)
+        self.start_time = time.perf_counter()
+        self.bound_time = None # seconds, or None if not reached
+
+    def improve(self, penalty, copy_state):
+        improved = BestState.improve(self, penalty, copy_state)
+        if (improved and (self.bound_time is None) and
+            (self.lower_bound is not None) and (penalty <= self.lower_bound)):
+            self.bound_time = time.perf_counter() - self.start_time
+        return improved
+
+# updategroups arguments for a class from make_class, creating groups for
+#   the conference after its last one
+#   returns (students, associationsdict, includeddict, excludeddict,
+#   questionsdict, pairtable)
+def class_inputs(classdata):
+    students = classdata["students"]
+    history = ConferenceHistory(students, len(classdata["conferences"]))
+    for n_conference in range(len(classdata["conferences"])):
+        ids, groups, questions = classdata["conferences"][n_conference]
+        history.set_conference(n_conference, ids, groups, questions)
+    (associationsdict, questionsdict,
+     pairtable) = build_associations(history.studentids, history.groups(),
+                                     history.questions())
+    excludeddict = {}
+    for student in students:
+        excludeddict[student[2]] = ""
+    ids, excluded = classdata["homework"][-1]
+    for studentid, excludedstr in zip(ids, excluded):
+        excludeddict[studentid] = excluded_string(excluded_mask(excludedstr))
+        # as read from a homework file
+    return (students, associationsdict, {}, excludeddict, questionsdict,
+            pairtable)
+
+# one updategroups run
+#   returns (final penalty, lower bound, seconds to the bound or None,
+#   wall time, best state)
+def run_solver(solver, inputs, seed, options):
+    random.seed(seed)
+    best = TimedBest()
+    start_time = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        if (solver.startswith("annealing")):
+            module = annealing
+            kwargs = {"mcmc_depth": options.mcmc_depth}
+            if (solver == "annealing-numpy"):
+                kwargs["engine"], kwargs["n_chains"] = "numpy", options.chains
+        else:
+            module = tempering
+            kwargs = {"tempering_depth": int(options.tempering_depth),
+                      "annealing_depth": int(options.annealing_depth)}
+            if (solver == "tempering-numpy"):
+                kwargs["engine"] = "numpy"
+        assignments, groups = module.updategroups(*inputs, headless=True,
+                                                  best=best, **kwargs)
+    wall_time = time.perf_counter() - start_time
+    penalty = module.mcmc_penalty(inputs[1], inputs[3], inputs[4],
+                                  assignments, groups)
+    return (penalty, best.lower_bound, best.bound_time, wall_time,
+            best.state)
+
+# proposals per second of a solver's inner loop, from a starting state
+#   inputs: from class_inputs
+#   annealing cools from its usual starting temperature, tempering runs one
+#   chain at temperature 1; lower_bound -1 keeps them from stopping early
+def proposal_rate(solver, state, inputs, n_proposals, n_chains):
+    pairtable = inputs[5]
+    questiontable = build_question_table(pairtable[0], inputs[3], inputs[4],
+                                         [0] + list(state.question))
+    if (solver.endswith("numpy")):
+        chains = MultiChain([state.copy() for n_chain in range(n_chains)],
+                            pairtable, questiontable)
+        depth = max(1, n_proposals // n_chains)
+        start_time = time.perf_counter()
+        chains.anneal([1.0e+6] * n_chains, depth, cooling=True,
+                      lower_bound=-1)
+        return depth * n_chains / (time.perf_counter() - start_time)
+    start_time = time.perf_counter()
+    if (solver == "annealing"):
+        annealing.anneal(state.copy(), pairtable, questiontable, n_proposals,
+                         verbose=False, lower_bound=-1)
+    else:
+        tempering.anneal(1.0, None, state.copy(), n_proposals, pairtable,
+                         questiontable, False, lower_bound=-1)
+    return n_proposals / (time.perf_counter() - start_time)
+
+# benchmark one class size
+#   returns list of result dicts, one per solver
+def benchmark_size(n_students, options):
+    classdata = make_class(n_students, options.conferences,
+                           seed=options.class_seed)
+    inputs = class_inputs(classdata)
+    results = []
+    for solver in options.solvers:
+        penalties, bound_times, wall_times = [], [], []
+        n_failed, state, lower_bound = 0, None, None
+        for seed in range(options.seeds):
+            try:
+                (penalty, lower_bound, bound_time, wall_time,
+                 best_state) = run_solver(solver, inputs, seed, options)
+            except Exception as error:
+                n_failed = n_failed + 1
+                print("{:d} students, {:s}, seed {:d}: {:s}".format(n_students,
+                                                                     solver,
+                                                                     seed,
+                                                                     repr(error)))
+                continue
+            penalties.append(penalty)
+            wall_times.append(wall_time)
+            if (bound_time is not None):
+                bound_times.append(bound_time)
+            if (state is None):
+                state = best_state
+        rate = None
+        if (state is not None):
+            rate = proposal_rate(solver, state, inputs, options.proposals,
+                                 options.chains)
+        result = {"students": n_students, "solver": solver,
+                  "seeds": options.seeds, "failed": n_failed,
+                  "proposals_per_second": rate,
+                  "lower_bound": lower_bound,
+                  "reached_bound": len(bound_times),
+                  "median_time_to_bound": (statistics.median(bound_times)
+                                           if bound_times else None),
+                  "median_wall_time": (statistics.median(wall_times)
+                                       if wall_times else None),
+                  "penalties": sorted(penalties)}
+        results.append(result)
+    return results
+
+# one line per result, e.g.
+#   100 annealing  5.1e+04/s  bound 64: 3/5 in 0.42 s  penalty 64/64/80  1.2 s
+def format_result(result):
+    if (result["proposals_per_second"] is None):
+        rate_str = "-"
+    else:
+        rate_str = "{:.3g}/s".format(result["proposals_per_second"])
+    n_runs = result["seeds"] - result["failed"]
+    if (result["lower_bound"] is None):
+        bound_str = "bound -"
+    else:
+        bound_str = "bound {:d}: {:d}/{:d}".format(result["lower_bound"],
+                                                  result["reached_bound"],
+                                                  n_runs)
+    if (result["median_time_to_bound"] is not None):
+        bound_str = bound_str + " in {:.2f} s".format(result["median_time_to_bound"])
+    penalties = result["penalties"]
+    if (penalties):
+        penalty_str = "penalty {:d}/{:d}/{:d}".format(penalties[0],
+                                                     int(statistics.median(penalties)),
+                                                     penalties[-1])
+        time_str = "{:.2f} s".format(result["median_wall_time"])
+    else:
+        penalty_str, time_str = "penalty -", "-"
+    line = "{:5d} {:16s} {:>11s}  {:30s} {:28s} {:s}".format(result["students"],
+                                                            result["solver"],
+                                                            rate_str,
+                                                            bound_str,
+                                                            penalty_str,
+                                                            time_str)
+    if (result["failed"] > 0):
+        line = line + "  ({:d} failed)".format(result["failed"])
+    return line
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark both solvers "
+                                     "on synthetic classes.")
+    parser.add_argument("--students", type=int, nargs="+",
+                        default=[20, 100, 500],
+                        help="class sizes (20 to 5000)")
+    parser.add_argument("--conferences", type=int, default=4,
+                        help="prior conferences per class")
+    parser.add_argument("--class-seed", type=int, default=0,
+                        help="seed for the synthetic classes")
+    parser.add_argument("--seeds", type=int, default=5,
+                        help="runs per solver, with seeds 0, 1, ...")
+    parser.add_argument("--solvers", nargs="+", choices=solver_names,
+                        default=solver_names)
+    parser.add_argument("--mcmc-depth", type=float, default=1e+5,
+                        help="annealing iterations")
+    parser.add_argument("--tempering-depth", type=float, default=1e+1,
+                        help="tempering exchange rounds")
+    parser.add_argument("--annealing-depth", type=float, default=1e+3,
+                        help="tempering iterations per chain per round")
+    parser.add_argument("--chains", type=int, default=4,
+                        help="chains for annealing-numpy")
+    parser.add_argument("--proposals", type=int, default=20000,
+                        help="proposals timed for proposals/s")
+    parser.add_argument("--jsonl", help="also append results to this file")
+    options = parser.parse_args(argv)
+    for n_students in options.students:
+        if ((n_students < 20) or (n_students > 5000)):
+            parser.error("--students must be between 20 and 5000")
+    print("students solver            proposals  time to bound"
+          "                  penalty min/median/max       wall time")
+    all_results = []
+    for n_students in options.students:
+        for result in benchmark_size(n_students, options):
+            print(format_result(result))
+            all_results.append(result)
+    if (options.jsonl is not None):
+        with open(options.jsonl, "a") as jsonlobject:
+            for result in all_results:
+                jsonlobject.write(json.dumps(result) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
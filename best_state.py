@@ -0,0 +1,82 @@
+# best state seen during the mcmc, for anytime answers
+#   the chains move on after finding a good state (often at high
+#   temperature), so the final state is not always the best one visited;
+#   the state is copied only when the penalty improves, and copies are
+#   cheap because GroupState keeps its assignment in compact arrays
+#   another thread can read penalty and state at any moment, and can set
+#   stop_requested to make the mcmc finish early with what it has
+#   a SIGINT (Ctrl-C) does the same while StopOnInterrupt is active
+#   work in other processes reaches the parent's BestState with a delay:
+#   forked multistart runs send their new best states through the result
+#   queue at most every 0.1 s (see multistart.py), and parallel tempering
+#   replicas report theirs once per exchange round (see replica_pool.py)
+#   listener: optional function(penalty, state), called on each new best
+# usage:
+#   best = BestState()
+#   best.improve(penalty, state.copy) # copy only made if penalty is lower
+#   with StopOnInterrupt(best):
+#       ... # mcmc loops check best.stop_requested
+#   assignments, groups = best.state.to_dicts()
+
+import os
+import signal
+import threading
+
+class BestState:
+    def __init__(self):
+        self.penalty = None # lowest penalty seen
+        self.state = None # GroupState copy with that penalty
+        self.stop_requested = False
+        self.listener = None # optional, told of each new best
+        self.lower_bound = None # lowest possible penalty (presolve.py),
+        # set by updategroups before the mcmc
+
+    # keep a copy of the state if its penalty is the lowest so far
+    #   copy_state: called only then, e.g. state.copy
+    #   returns whether the state was kept
+    def improve(self, penalty, copy_state):
+        if ((self.penalty is not None) and (penalty >= self.penalty)):
+            return False
+        self.state = copy_state()
+        self.penalty = penalty
+        if (self.listener is not None):
+            self.listener(penalty, self.state)
+        return True
+
+    # best assignment so far as dictionaries, or None before the first
+    #   (assignments, groups); see GroupState.to_dicts
+    def result(self):
+        state = self.state
+        if (state is None):
+            return None
+        return state.to_dicts()
+
+# while active, a first SIGINT sets best.stop_requested instead of raising
+#   KeyboardInterrupt; a second SIGINT raises it as usual
+#   worker processes forked while active inherit the handler, so each one
+#   stops and reports its own best state
+#   only installed in the main thread (signals cannot be handled elsewhere)
+class StopOnInterrupt:
+    def __init__(self, best):
+        self.best = best
+        self.previous_handler = None
+        self.pid = None # process that installed the handler
+
+    def handle(self, signum, frame):
+        if (self.best.stop_requested):
+            raise KeyboardInterrupt
+        self.best.stop_requested = True
+        if (os.getpid() == self.pid): # workers stop quietly
+            print("Interrupted. Stopping with the best groups so far.")
+
+    def __enter__(self):
+        if (threading.current_thread() is threading.main_thread()):
+            self.pid = os.getpid()
+            self.previous_handler = signal.signal(signal.SIGINT, self.handle)
+        return self.best
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if (self.previous_handler is not None):
+            signal.signal(signal.SIGINT, self.previous_handler)
+            self.previous_handler = None
+        return False
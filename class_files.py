@@ -0,0 +1,118 @@
+# reading a class's roster, conference and homework files
+#   each file is read in one pass with the csv module (so quoted fields,
+#   commas inside quotes and a missing final newline are all handled) and
+#   returned as typed numpy columns, ready for the history cache
+#   lines starting with "#" and blank lines are skipped
+#   file formats are described at the top of conference_annealing_sp20.py
+#   a class's files are found with one directory listing, instead of
+#   probing for _conf1.csv, _conf2.csv, ... until one is missing
+# usage:
+#   classfiles = find_class_files(rosterpath, userclass)
+#   conferencefile = classfiles["conferences"][1] # by number
+#   roster = read_roster(rosterfile) # lastnames, firstnames, ids
+#   conference = read_conference(conferencefile) # ids, groups, questions
+#   homework = read_homework(homeworkfile) # ids, excluded
+#   excludedstr = excluded_string(homework["excluded"][row])
+
+import os
+import re
+import csv
+import numpy
+
+absent_bit = 15 # excluded bit set for an "x" (absent) entry
+
+# all files of one class in its directory, from a single listing
+#   rosterpath: directory, ending in "/"; file paths are rosterpath + name
+#   returns dict: "roster": path or None, "conferences", "readables" and
+#   "homework": key = number, value = path
+#   numbering may have gaps; a missing directory gives no files
+def find_class_files(rosterpath, userclass):
+    prefix = "astr" + userclass + "_"
+    pattern = re.compile(re.escape(prefix) +
+                         r"(conf|hw)([0-9]+)(\.csv|_readable\.txt)$")
+    classfiles = {"roster": None, "conferences": {}, "readables": {},
+                  "homework": {}}
+    try:
+        names = sorted(entry.name for entry in os.scandir(rosterpath or ".")
+                       if entry.is_file())
+    except OSError:
+        names = []
+    for name in names:
+        if (name == prefix + "roster_conferences_csv.csv"):
+            classfiles["roster"] = rosterpath + name
+            continue
+        match = pattern.match(name)
+        if (match is None):
+            continue
+        kind, number, suffix = match.group(1), int(match.group(2)), match.group(3)
+        if ((kind == "conf") and (suffix == ".csv")):
+            classfiles["conferences"][number] = rosterpath + name
+        elif (kind == "conf"):
+            classfiles["readables"][number] = rosterpath + name
+        elif (suffix == ".csv"):
+            classfiles["homework"][number] = rosterpath + name
+    return classfiles
+
+# rows of a csv file, without comments or blank lines
+#   n_fields: number of leading fields kept; fewer is an error
+def read_rows(filename, n_fields):
+    with open(filename, "r", newline="") as fileobject:
+        lines = [line for line in fileobject.read().splitlines()
+                 if ((not line.startswith("#")) and (line.strip() != ""))]
+    rows = []
+    for fields in csv.reader(lines, skipinitialspace=True):
+        if (len(fields) < n_fields):
+            raise ValueError("Expected {:d} fields in {:s}: {:s}".format(n_fields,
+                                                                           filename,
+                                                                           ", ".join(fields)))
+        rows.append([field.strip() for field in fields[:n_fields]])
+    return rows
+
+# roster file, as columns: lastnames, firstnames, ids
+def read_roster(rosterfile):
+    rows = read_rows(rosterfile, 3) # lastname, firstname, id
+    return {"lastnames": numpy.array([row[0] for row in rows], dtype=str),
+            "firstnames": numpy.array([row[1] for row in rows], dtype=str),
+            "ids": numpy.array([int(row[2]) for row in rows],
+                               dtype=numpy.int64)}
+
+# conference file, as columns: ids, groups, questions
+#   students without a group are left out
+def read_conference(conferencefile):
+    rows = [row for row in read_rows(conferencefile, 5)
+            if (row[3] != "")] # lastname, firstname, id, group, question
+    return {"ids": numpy.array([int(row[2]) for row in rows],
+                               dtype=numpy.int64),
+            "groups": numpy.array([int(row[3]) for row in rows],
+                                  dtype=numpy.int16),
+            "questions": numpy.array([int(row[4]) for row in rows],
+                                     dtype=numpy.int16)}
+
+# excluded string from the homework file as a bitmask
+#   bit q: question q was not completed; absent_bit: "x" (not present)
+def excluded_mask(excludedstr):
+    mask = 0
+    for character in excludedstr:
+        if (character.isdigit()):
+            mask = mask | (1 << int(character))
+        elif (character == "x"):
+            mask = mask | (1 << absent_bit)
+    return mask
+
+# bitmask back to an excluded string, e.g. "12" or "0x"
+def excluded_string(mask):
+    mask = int(mask)
+    excludedstr = "".join(str(questionid) for questionid in range(10)
+                          if (mask & (1 << questionid)))
+    if (mask & (1 << absent_bit)):
+        excludedstr = excludedstr + "x"
+    return excludedstr
+
+# homework file, as columns: ids, excluded (bitmasks, see excluded_mask)
+#   a student listed more than once keeps their last entry
+def read_homework(homeworkfile):
+    rows = read_rows(homeworkfile, 4) # lastname, firstname, id, excluded
+    return {"ids": numpy.array([int(row[2]) for row in rows],
+                               dtype=numpy.int64),
+            "excluded": numpy.array([excluded_mask(row[3]) for row in rows],
+                                    dtype=numpy.uint16)}
@@ -12,15 +12,30 @@
 # import relevant libraries
 import math
 import random
-from matplotlib import pyplot # for plotting mcmc convergence
+import sys
+import time
+import argparse
 import json
-from copy import deepcopy
-
-# function to merge two dictionaries
-def merge_dictionaries(dict1, dict2):
-    dict3 = dict1.copy()
-    dict3.update(dict2)
-    return dict3
+from group_scoring import GroupScorer # incremental penalty for mcmc moves
+from group_scoring import build_pair_table # prior associations matrix
+from group_scoring import build_question_table # question history and hw
+from group_state import GroupState # array-backed solver state
+from multichain import MultiChain # lockstep numpy chains
+from multichain import stall_temperature # where stall_window starts counting
+from multistart import run_multistart # best of several runs
+from multistart import multistart_processes # runs at once
+from convergence_telemetry import PenaltyRecorder # bounded penalty history
+from move_selection import MoveSelector # adaptive move probabilities
+from initial_assignment import initialize_state # balanced, greedy start
+from initial_assignment import start_temperatures # default, by start
+from presolve import presolve # penalty lower bound
+from class_files import read_roster, read_conference, read_homework
+from class_files import excluded_string # homework bitmask as a string
+from class_files import find_class_files # one directory listing
+from history_cache import HistoryCache # parsed files, kept between runs
+from prior_associations import build_associations # one pass
+from conference_history import ConferenceHistory # columnar history
+from best_state import BestState, StopOnInterrupt # anytime best answer
 
 # function to count how many students per group
 def invert_groups(assignments, groups):
@@ -62,9 +77,124 @@ def mcmc_penalty(priorassociations, excludehw, pastdict,
             penalty = penalty + 2 ** max_exponent
     return penalty
 
+# single annealing chain, cooled linearly from initial_temperature to 0
+#   state is a GroupState, changed in place
+#   cancel: optional event; stop early once it is set
+#   recorder: optional PenaltyRecorder for graphing convergence
+#   selector: optional MoveSelector (move_selection.py); without one, the
+#   moves are question swaps (20%) and single-student moves (80%)
+#   lower_bound: stop once the penalty reaches it (see presolve.py)
+#   deadline: optional time.monotonic() time to stop by; the temperature
+#   follows the iterations or the time used, whichever is further along
+#   stall_window: optional, stop after this many iterations without a new
+#   lowest penalty, counted once the temperature is below stall_temperature
+#   (see multichain.py)
+#   best: optional BestState (best_state.py); keeps a copy of the lowest
+#   penalty state, and the run stops once best.stop_requested is set
+#   returns final penalty
+def anneal(state, pairtable, questiontable, mcmc_depth, recorder=None,
+           cancel=None, verbose=True, initial_temperature=1.0e+6,
+           selector=None, lower_bound=0, deadline=None, stall_window=None,
+           best=None):
+    open_students, open_groupindices = state.open_students, state.open_groups
+    n_open_groups = len(open_groupindices)
+    n_groups = len(state.groupids)
+    scorer = GroupScorer(state, pairtable, questiontable)
+    penalty_initial = scorer.penalty
+    if (recorder is not None):
+        recorder.record(penalty_initial)
+    start_time, time_fraction = time.monotonic(), 0.0
+    penalty_lowest, n_lowest = penalty_initial, 0
+    if (best is not None):
+        best.improve(penalty_initial, state.copy)
+    for n_iteration in range(int(mcmc_depth)):
+        if (penalty_initial <= lower_bound):
+            break # no better solution can be found
+        if ((best is not None) and best.stop_requested):
+            break # interrupted; best holds the answer so far
+        if ((cancel is not None) and (n_iteration % 1000 == 0) and
+            cancel.is_set()):
+            break # another run already found a solution
+        temperature = ((mcmc_depth - n_iteration) / mcmc_depth *
+                       initial_temperature)
+        if (deadline is not None):
+            if (n_iteration % 100 == 0): # the clock is read now and then
+                time_now = time.monotonic()
+                if (time_now >= deadline):
+                    if (verbose == True):
+                        print("Time budget used after MCMC iteration {:d}.".format(n_iteration))
+                    break # out of time
+                time_fraction = ((time_now - start_time) /
+                                 (deadline - start_time))
+            temperature = min(temperature,
+                              (1.0 - time_fraction) * initial_temperature)
+        if (selector is not None):
+            move = selector.choose(n_open_groups > 1, len(open_students) > 1)
+        elif ((random.random() > 0.8) and (n_open_groups > 1)):
+            move = "swap"
+        else:
+            move = "move"
+        if (move == "swap"):
+            # swap two groups' questions
+            group1, group2 = random.sample(open_groupindices, 2)
+            penalty_new = (penalty_initial +
+                           scorer.propose_swap(group1, group2))
+            # only the two groups' members are rescored
+        elif (move == "trade"):
+            # swap two students between their groups
+            student1, student2 = random.sample(open_students, 2)
+            penalty_new = (penalty_initial +
+                           scorer.propose_trade(student1, student2))
+            # group sizes are unchanged
+        else:
+            # swap one student's groups
+            student1 = random.choice(open_students)
+            group2 = random.randrange(n_groups)
+            penalty_new = (penalty_initial +
+                           scorer.propose_move(student1, group2))
+            # only the source and destination groups are rescored
+        #print("{:s} {:f}, {:f}".format(move, penalty_new - penalty_initial,
+        #                               temperature))
+        try:
+            acceptance_threshold = min(1.0, math.exp(-(penalty_new -
+                                                       penalty_initial) /
+                                                     temperature))
+        except OverflowError:
+            acceptance_threshold = 1.0
+        #if ((penalty_new < penalty_initial) or
+        #    (random.random() < penalty_limit)): # accept the move
+        accepted = (random.random() < acceptance_threshold)
+        if (selector is not None):
+            selector.update(move, accepted, penalty_new - penalty_initial)
+        if (accepted):
+            penalty_initial = penalty_new
+            scorer.accept()
+            if ((best is not None) and (penalty_initial < best.penalty)):
+                best.improve(penalty_initial, state.copy)
+        # a rejected move leaves nothing to undo
+        if (recorder is not None):
+            recorder.record(penalty_initial)
+        if (penalty_initial < penalty_lowest):
+            penalty_lowest, n_lowest = penalty_initial, n_iteration
+        elif (temperature >= stall_temperature):
+            n_lowest = n_iteration # still hot; the stall window waits
+        elif ((stall_window is not None) and
+              (n_iteration - n_lowest >= stall_window)):
+            if (verbose == True):
+                print("No improvement in {:d} MCMC iterations.".format(int(stall_window)))
+            break
+        if ((verbose == True) and (n_iteration % (mcmc_depth / 10) == 0)):
+            print("Finished MCMC iteration {:d}.".format(n_iteration + 1))
+    return penalty_initial
+
 # mcmc
 def updategroups(studentslist, priorassociations, includegroup, excludehw,
-                 pastdict):
+                 pastdict, pairtable=None, mcmc_depth=1e+5,
+                 initial_temperature=None, start="greedy",
+                 engine="python", n_chains=1,
+                 n_starts=1, n_processes=None, adaptive_moves=False,
+                 time_budget=None, stall_window=None, telemetry_path=None,
+                 headless=False, best=None):
     # list of students (lastname, firstname, id)
     # dictionary of prior associations
     #   key = student id, value = list including multiples
@@ -74,7 +204,38 @@ def updategroups(studentslist, priorassociations, includegroup, excludehw,
     #   key = student id, value = string (detailed above)
     # dictionary of which questions assigned in past conferences
     #   key = student id, value = list
+    # matrix of prior associations, from build_pair_table (optional)
+    # number of mcmc iterations
+    # starting temperature, cooled linearly to 0
+    #   default: from start_temperatures (initial_assignment.py), 1e6 for a
+    #   random start and 4 for balanced and greedy starts
+    # start: "random" groups, "balanced" sizes, or "greedy" (balanced sizes,
+    #   each student placed where they add the least penalty)
+    # engine: "python" (one chain) or "numpy" (n_chains in lockstep)
+    #   numpy has a fixed cost per step, so it only beats python on total
+    #   proposals per second with many chains (about 16 or more)
+    # n_starts: best of this many python runs, in up to n_processes workers
+    # adaptive_moves: add student trades and adapt move probabilities
+    #   (python engine only)
+    # time_budget: optional, seconds for the mcmc (cooling speeds up to fit)
+    #   with n_starts, runs that go one after another share it evenly
+    # stall_window: optional, stop after this many iterations without a new
+    #   lowest penalty, counted once the chains have cooled (see anneal)
+    # telemetry_path: optional JSONL file to stream convergence summaries to
+    # headless: skip the convergence plot (matplotlib is never imported)
+    # best: optional BestState, for reading the best groups so far from
+    #   another thread or stopping early (Ctrl-C also stops early)
     track_penalties = True # for graphing convergence
+    if (initial_temperature is None):
+        initial_temperature = start_temperatures[start]
+    if (best is None):
+        best = BestState()
+    deadline = None
+    if (time_budget is not None):
+        deadline = time.monotonic() + time_budget
+    telemetry_stream = None
+    if ((track_penalties == True) and (telemetry_path is not None)):
+        telemetry_stream = open(telemetry_path, "w")
     n_credit = 0
     protected_assignments, open_assignments = {}, {}
     protected_groups, open_groups, existing_groups = {}, {}, {}
@@ -120,8 +281,13 @@ def updategroups(studentslist, priorassociations, includegroup, excludehw,
     n_open_groups = len(open_groups)
     # randomly assign remaining students to groups
     # remember to penalize groups of fewer than 4 or more than 5
-    for studentid in open_assignments:
-        open_assignments[studentid] = random.choice(group_numbers)
+    if (start == "random"):
+        for studentid in open_assignments:
+            open_assignments[studentid] = random.choice(group_numbers)
+    else:
+        for studentid in open_assignments:
+            open_assignments[studentid] = group_numbers[0]
+            # placeholder, replaced by initialize_state
     # create list of question numbers to be assigned
     if (n_groups % 3 == 2):
         # allocate extra to q1 and q2
@@ -196,370 +362,480 @@ def updategroups(studentslist, priorassociations, includegroup, excludehw,
     # choose whether to change one student's group or two groups' questions
     # calculate penalty
     # remember to break if penalty = 0
-    open_studentids = list(open_assignments.keys())
-    open_groupids = list(open_groups.keys())
-    mcmc_depth = 1e+5
-    new_assignments = merge_dictionaries(protected_assignments,
-                                         open_assignments)
-    new_groups = merge_dictionaries(protected_groups, open_groups)
-    penalty_initial = mcmc_penalty(priorassociations, excludehw, pastdict,
-                                   new_assignments, new_groups)
-    if (track_penalties == True):
-        penalty_history = [penalty_initial]
-    for n_iteration in range(int(mcmc_depth)):
-        if (penalty_initial == 0):
-            break # no better solution can be found
-        temperature = (mcmc_depth - n_iteration) / mcmc_depth * 1.0e+6
-        if ((random.random() > 0.8) and (n_open_groups > 1)):
-            # swap two groups' questions
-            groupid1, groupid2 = random.sample(open_groupids, 2)
-            question1, question2 = (open_groups[groupid1],
-                                    open_groups[groupid2])
-            (open_groups[groupid1],
-             open_groups[groupid2]) = question2, question1
-            new_assignments = merge_dictionaries(protected_assignments,
-                                                 open_assignments)
-            new_groups = merge_dictionaries(protected_groups, open_groups)
-            penalty_new = mcmc_penalty(priorassociations, excludehw, pastdict,
-                                       new_assignments, new_groups)
-            #print("questions {:f}, {:f}".format(penalty_new - penalty_initial,
-            #                                    temperature))
-            try:
-                acceptance_threshold = min(1.0, math.exp(-(penalty_new -
-                                                           penalty_initial) /
-                                                         temperature))
-            except OverflowError:
-                acceptance_threshold = 1.0
-            #if ((penalty_new < penalty_initial) or
-            #    (random.random() < penalty_limit)): # accept the move
-            if (random.random() < acceptance_threshold):
-                penalty_initial = penalty_new
-            else: # reject the move
-                (open_groups[groupid1],
-                 open_groups[groupid2]) = question1, question2
+    if (pairtable is None):
+        pairtable = build_pair_table(list(priorassociations.keys()),
+                                     priorassociations)
+    questiontable = build_question_table(pairtable[0], excludehw, pastdict,
+                                         list(protected_groups.values()) +
+                                         list(open_groups.values()))
+    # compiled once, so each student's question costs one table read
+    state = GroupState(pairtable[0], protected_assignments, open_assignments,
+                       protected_groups, open_groups)
+    # students and groups as dense indices; protected ones are never proposed
+    initialize_state(state, pairtable, questiontable, start)
+    lower_bound, presolve_notes = presolve(state, pairtable, questiontable)
+    # the mcmc stops once this penalty is reached
+    best.lower_bound = lower_bound
+    for note in presolve_notes:
+        print(note)
+    if (lower_bound > 0):
+        print("Lowest possible penalty: {:d}".format(lower_bound))
+    # another random starting state, for restarts
+    def random_start():
+        start_assignments, start_groups = {}, dict(open_groups)
+        for studentid in open_assignments:
+            if (start == "random"):
+                start_assignments[studentid] = random.choice(group_numbers)
+            else:
+                start_assignments[studentid] = group_numbers[0]
+        random.shuffle(open_questions)
+        for pair in zip(list(open_groups.keys()), open_questions):
+            start_groups[pair[0]] = pair[1]
+        start_state = GroupState(pairtable[0], protected_assignments,
+                                 start_assignments, protected_groups,
+                                 start_groups)
+        return initialize_state(start_state, pairtable, questiontable, start)
+    if (adaptive_moves and (engine == "numpy")):
+        print("Lockstep chains use fixed moves. Ignoring adaptive_moves.")
+        adaptive_moves = False
+    with StopOnInterrupt(best):
+        if (engine == "numpy"):
+            # restart ensemble: n_chains random starts, cooled together
+            chain_states = [state]
+            for n_chain in range(1, n_chains):
+                chain_states.append(random_start())
+            chains = MultiChain(chain_states, pairtable, questiontable)
+            if (track_penalties == True):
+                chain_recorders = [PenaltyRecorder(stream=telemetry_stream,
+                                                   label=n_chain)
+                                   for n_chain in range(n_chains)]
+            else:
+                chain_recorders = None
+            chain_energies = chains.anneal([initial_temperature] * n_chains,
+                                           mcmc_depth,
+                                           cooling=True, recorders=chain_recorders,
+                                           lower_bound=lower_bound,
+                                           deadline=deadline,
+                                           stall_window=stall_window,
+                                           best=best)
+            chains.write_states()
+            penalty = min(chain_energies)
+            best_chain = chain_energies.index(penalty)
+            state = chain_states[best_chain]
+            if (track_penalties == True):
+                for recorder in chain_recorders:
+                    recorder.flush() # partial last windows
+                if (chains.best_chain is not None):
+                    best_chain = chains.best_chain
+                    # the returned groups are best.state, found by this one
+                penalty_history = chain_recorders[best_chain]
+            print("Finished {:d} MCMC chains.".format(n_chains))
+        elif (n_starts > 1):
+            # best of n_starts independent runs, one seed each
+            # all runs stop as soon as any of them reaches lower_bound
+            # with a time budget, each wave of runs at once gets an equal
+            # share of the time left, and runs not started by the deadline
+            # are skipped
+            n_waves = math.ceil(n_starts /
+                                multistart_processes(n_starts, n_processes))
+            n_runs = [0] # runs started in this process
+            best_recorder = [None] # recorder of the run that found best
+            def run_once(cancel):
+                run_deadline = deadline
+                if (deadline is not None):
+                    n_waves_left = max(1, n_waves - n_runs[0])
+                    run_deadline = (time.monotonic() +
+                                    (deadline - time.monotonic()) / n_waves_left)
+                n_runs[0] = n_runs[0] + 1
+                start_state = random_start()
+                if (track_penalties == True):
+                    recorder = PenaltyRecorder()
+                else:
+                    recorder = None
+                if (adaptive_moves):
+                    selector = MoveSelector()
+                else:
+                    selector = None
+                penalty_before = best.penalty
+                anneal(start_state, pairtable, questiontable, mcmc_depth,
+                       recorder, cancel, verbose=False,
+                       initial_temperature=initial_temperature,
+                       selector=selector, lower_bound=lower_bound,
+                       deadline=run_deadline, stall_window=stall_window,
+                       best=best)
+                if ((best.stop_requested) or
+                    ((deadline is not None) and
+                     (time.monotonic() >= deadline))):
+                    cancel.set() # interrupted or out of time; skip the
+                    # remaining runs
+                if ((penalty_before is None) or (best.penalty < penalty_before)):
+                    best_recorder[0] = recorder
+                return (best.penalty, best.state, best_recorder[0])
+            seeds = [random.getrandbits(32) for n_start in range(n_starts)]
+            results = run_multistart(run_once, seeds, n_processes, lower_bound,
+                                     best)
+            penalty, state, penalty_history = min(results,
+                                                  key=lambda result: result[0])
+            best.improve(penalty, lambda: state) # workers had their own copies
+            if (telemetry_stream is not None):
+                penalty_history.dump(telemetry_stream) # best run only
+            print("Best of {:d} MCMC runs: {:d}".format(len(results), penalty))
         else:
-            # swap one student's groups
-            studentid1 = random.choice(open_studentids)
-            group1, group2 = (open_assignments[studentid1],
-                              random.choice(group_numbers))
-            #studentid1, studentid2 = random.sample(open_studentids, 2)
-            #group1, group2 = (open_assignments[studentid1],
-            #                  open_assignments[studentid2])
-            #(open_assignments[studentid1],
-            # open_assignments[studentid2]) = group2, group1
-            open_assignments[studentid1] = group2
-            new_assignments = merge_dictionaries(protected_assignments,
-                                                 open_assignments)
-            new_groups = merge_dictionaries(protected_groups, open_groups)
-            penalty_new = mcmc_penalty(priorassociations, excludehw, pastdict,
-                                       new_assignments, new_groups)
-            #print("groups {:f}, {:f}".format(penalty_new - penalty_initial,
-            #                                 temperature))
-            try:
-                acceptance_threshold = min(1.0, math.exp(-(penalty_new -
-                                                           penalty_initial) /
-                                                         temperature))
-            except OverflowError:
-                acceptance_threshold = 1.0
-            #if ((penalty_new < penalty_initial) or
-            #    (random.random() < penalty_limit)): # accept the move
-            if (random.random() < acceptance_threshold):
-                penalty_initial = penalty_new
-            else: # reject the move
-                open_assignments[studentid1] = group1
-                #(open_assignments[studentid1],
-                # open_assignments[studentid2]) = group1, group2
-        if (track_penalties == True):
-            penalty_history.append(penalty_initial)
-        if (n_iteration % (mcmc_depth / 10) == 0):
-            print("Finished MCMC iteration {:d}.".format(n_iteration + 1))
+            if (track_penalties == True):
+                penalty_history = PenaltyRecorder(stream=telemetry_stream)
+            else:
+                penalty_history = None
+            if (adaptive_moves):
+                selector = MoveSelector()
+            else:
+                selector = None
+            penalty = anneal(state, pairtable, questiontable, mcmc_depth,
+                             penalty_history,
+                             initial_temperature=initial_temperature,
+                             selector=selector, lower_bound=lower_bound,
+                             deadline=deadline, stall_window=stall_window,
+                             best=best)
+    # the chains keep moving after their lowest penalty, so the best state
+    # seen is returned instead of where they stopped
+    penalty, state = best.penalty, best.state
+    if (telemetry_stream is not None):
+        penalty_history.flush()
+        telemetry_stream.close()
     # structure return data
-    return_assignments = merge_dictionaries(protected_assignments,
-                                            open_assignments)
-    return_groups = merge_dictionaries(protected_groups, open_groups)
+    return_assignments, return_groups = state.to_dicts()
     if (track_penalties == True):
-        pyplot.ion()
-        pyplot.plot([i for i in range(len(penalty_history))],
-                    penalty_history, "-")
-        # solid black line, no markers
-        pyplot.show()
-        print("Final MCMC penalty: {:d}".format(penalty_history[-1]))
+        if (not headless):
+            from matplotlib import pyplot # only imported when plotting
+            iterations, mins, means, maxs = penalty_history.columns()
+            # min, mean and max per window of iterations
+            pyplot.ion()
+            pyplot.plot(iterations, means, "-")
+            # solid black line, no markers
+            pyplot.fill_between(iterations, mins, maxs, alpha=0.3)
+            pyplot.show()
+        print("Final MCMC penalty: {:d}".format(penalty))
         inverse_groups = invert_groups(return_assignments, return_groups)
         for groupid in inverse_groups:
             print("Students in Group {:d}: {:d}".format(groupid, len(inverse_groups[groupid])))
     return (return_assignments, return_groups)
 
-# get path data from user
-userclass = input("Please enter the class name. \nastr")
-rosterpath = userclass + "/"
-rostername = "astr" + userclass + "_roster_conferences_csv.csv"
-print("The default roster path is: " + rosterpath)
-userpath = input("Specify the roster path if different from default. ")
-if (userpath != ""):
-    rosterpath = userpath
-if (not (rosterpath.endswith("/"))): # append "/" to path if necessary
-    rosterpath = rosterpath + "/"
-print("The default roster file is: " + rostername)
-userfile = input("Specify the roster file if different from default. ")
-if (userfile != ""):
-    rostername = userfile
-rosterfile = rosterpath + rostername
-print("The roster file to be checked is: " + rosterfile)
-
-# check whether roster exists
-#   if it doesn't, generate message and exit
-#   if it does, read in the information
-try:
-    students = []
-    with open(rosterfile, "r") as rosterobject:
-        for line in rosterobject:
-            if (not (line.startswith("#")) and not (line == "")):
-                if (line[-1] == "\n"):
-                    linedata = line[:-1].split(",") # without newline character
-                else:
-                    linedata = line.split(",")
-                for index in range(3): # lastname, firstname, id
-                    linedata[index] = linedata[index].replace("\"", "").strip()
-                    # strip quotation marks, then whitespace
-                students.append(linedata[:2]) # lastname, firstname, id
-                students[-1].append(int(linedata[2]))
-    print("Roster found and read.")
-except:
-    students = []
-    print("Error reading roster. Exiting.")
-
-# check whether prior conference data exists
-#   if it does, append to priorconferences array
-if students: # evaluates as false if students array is empty
-    priorconferences = deepcopy(students) # will be appended with group numbers
-    conferencecounter = 1
-    conferencefound = True
-    while conferencefound:
-        try:
-            conferencefile = (rosterpath + "astr" + userclass + "_conf" +
-                              str(conferencecounter) + ".csv")
-            with open(conferencefile, "r") as conferenceobject:
-                conferencedict = {}
-                posterdict = {}
-                for line in conferenceobject:
-                    if (not (line.startswith("#")) and not (line == "")):
-                        linedata = line[:-1].split(",")
-                        # without newline character
-                        for index in range(5):
-                            # lastname, firstname, id, group, question
-                            linedata[index] = linedata[index].replace("\"", "").strip()
-                            # strip quotation marks, then whitespace
-                        studentid = int(linedata[2])
-                        if (linedata[3] != ""):
-                            studentgroup = int(linedata[3])
-                            questionid = int(linedata[4])
-                            conferencedict[studentid] = studentgroup
-                            posterdict[studentid] = questionid
-                for line in priorconferences: # lastname, firstname, id
-                    studentid = line[2]
-                    if (studentid in conferencedict):
-                        line.extend([conferencedict[studentid],
-                                     posterdict[studentid]])
-                    else:
-                        line.extend(["", ""])
-                        # lastname, firstname, id, group(s)/question(s)
-            print("Conference " + str(conferencecounter) + " found and read.")
-            conferencecounter = conferencecounter + 1
-        except:
-            print("Conference " + str(conferencecounter) +
-                  " not read. Continuing.")
-            conferencecounter = conferencecounter - 1
-            conferencefound = False
+# command-line options
+#   without a class name, main() prompts for the class, path and file
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Assign students to "
+                                     "conference groups by simulated "
+                                     "annealing.")
+    parser.add_argument("userclass", nargs="?",
+                        help="class name, without the leading astr")
+    parser.add_argument("--path", dest="rosterpath",
+                        help="roster path (default: class name)")
+    parser.add_argument("--roster", dest="rostername",
+                        help="roster file name in the roster path")
+    parser.add_argument("--mcmc-depth", type=float, default=1e+5,
+                        help="number of mcmc iterations")
+    parser.add_argument("--temperature", type=float,
+                        help="starting temperature, cooled linearly to 0 "
+                        "(default: 1e6 for --start random, 4 otherwise)")
+    parser.add_argument("--start", choices=["random", "balanced", "greedy"],
+                        default="greedy", help="starting assignment")
+    parser.add_argument("--engine", choices=["python", "numpy"],
+                        default="python",
+                        help="numpy runs --chains in lockstep; it is slower "
+                        "than python per proposal below about 16 chains")
+    parser.add_argument("--chains", type=int, default=1,
+                        help="lockstep chains for the numpy engine")
+    parser.add_argument("--starts", type=int, default=1,
+                        help="best of this many python runs")
+    parser.add_argument("--processes", type=int,
+                        help="worker processes for --starts")
+    parser.add_argument("--adaptive-moves", action="store_true",
+                        help="add student trades and adapt move "
+                        "probabilities")
+    parser.add_argument("--time-budget", type=float,
+                        help="seconds for the mcmc (with --starts, split "
+                        "evenly between the runs that go one after another)")
+    parser.add_argument("--stall-window", type=int,
+                        help="stop after this many iterations without "
+                        "improvement, counted once the temperature is "
+                        "below {:g}".format(stall_temperature))
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="parse every file, without the history cache")
+    parser.add_argument("--seed", type=int,
+                        help="random seed, for reproducible runs")
+    parser.add_argument("--telemetry",
+                        help="JSONL file for convergence summaries")
+    parser.add_argument("--headless", action="store_true",
+                        help="do not plot convergence")
+    return parser.parse_args(argv)
 
-# check which homework data exists
-# determine whether to create new groups or append existing conference
-if students: # evaluates as false if students array is empty
-    homeworkcounter = 0
-    homeworkfound = True
-    while homeworkfound:
-        try:
-            homeworkcounter = homeworkcounter + 1
-            homeworkfile = (rosterpath + "astr" + userclass + "_hw" +
-                            str(homeworkcounter) + ".csv")
-            with open(homeworkfile, "r") as homeworkobject:
-                pass
-        except:
-            homeworkcounter = homeworkcounter - 1
-            homeworkfound = False
-    if (homeworkcounter == 0):
-        print("No homework found. Exiting.")
-        operation = "none"
+# prompt for or parse the class, then update its groups
+#   argv: command-line arguments (default sys.argv[1:])
+#   returns exit status: 0 if groups were written, 1 otherwise
+def main(argv=None):
+    options = parse_arguments(argv)
+    interactive = (options.userclass is None) # prompt for what is not given
+    if (options.seed is not None):
+        random.seed(options.seed)
+    # get path data from user
+    if (interactive):
+        userclass = input("Please enter the class name. \nastr")
     else:
-        print("Most recent homework found: " + str(homeworkcounter))
-        if (homeworkcounter == conferencecounter + 1):
-            operation = "create"
-            print("New groups will be generated for Conference " +
-                  str(homeworkcounter))
-        elif (homeworkcounter == conferencecounter):
-            operation = "update"
-            print("Existing groups will be updated for Conference " +
-                  str(homeworkcounter))
-        else:
-            operation = "none"
-            print("No action will be taken.")
-else:
-    operation = "none"
+        userclass = options.userclass
+    rosterpath = userclass + "/"
+    rostername = "astr" + userclass + "_roster_conferences_csv.csv"
+    print("The default roster path is: " + rosterpath)
+    if (options.rosterpath is not None):
+        userpath = options.rosterpath
+    elif (interactive):
+        userpath = input("Specify the roster path if different from default. ")
+    else:
+        userpath = ""
+    if (userpath != ""):
+        rosterpath = userpath
+    if (not (rosterpath.endswith("/"))): # append "/" to path if necessary
+        rosterpath = rosterpath + "/"
+    print("The default roster file is: " + rostername)
+    if (options.rostername is not None):
+        userfile = options.rostername
+    elif (interactive):
+        userfile = input("Specify the roster file if different from default. ")
+    else:
+        userfile = ""
+    if (userfile != ""):
+        rostername = userfile
+    rosterfile = rosterpath + rostername
+    print("The roster file to be checked is: " + rosterfile)
+    final_penalty = update_class(userclass, rosterpath, rosterfile, options)
+    if (final_penalty is None):
+        return 1 # nothing written
+    return 0
 
-# generate list of prior associations
-if (operation != "none"):
-    associationsdict, questionsdict = {}, {}
-    # for each student, create a set of prior partners
-    for line in students: # lastname, firstname, id
-        studentid = line[2]
-        associationsdict[studentid] = []
-        questionsdict[studentid] = []
-    for conferenceiteration in range(conferencecounter):
-        groupiteration = 1
-        groupfound = True
-        while groupfound:
-            group = set()
-            for line in priorconferences: # lastname, firstname, id, group(s)/question(s)
-                studentid = line[2]
-                groupid = line[3 + conferenceiteration * 2] # indexed from 0
-                if (groupid == groupiteration):
-                    group.add(studentid)
-                    questionid = line[4 + conferenceiteration * 2]
-            for studentid in group:
-                associationsdict[studentid] = associationsdict[studentid] + list(group.difference(set((studentid,))))
-                questionsdict[studentid] = questionsdict[studentid] + list((questionid,))
-            if (len(group) > 0):
-                groupiteration = groupiteration + 1
-            else:
-                groupfound = False
-    print("List of prior associations built.")
-            
-# create placeholder for new group if necessary
-#   otherwise, read existing groups
-# read homework
-if (operation == "create"):
-    includeddict = {}
-    for line in priorconferences: # lastname, firstname, id, group(s)/question(s)
-        line.extend(["", ""])
-        #studentid = line[2]
-        #includeddict[studentid] = ("", "")
-if (operation == "update"):
-    includeddict = {}
-    for line in priorconferences: # lastname, firstname, id, group(s)/question(s)
-        studentid = line[2]
-        groupid = line[3 + conferencecounter * 2] # indexed from 0
-        questionid = line[4 + conferencecounter * 2]
-        includeddict[studentid] = (groupid, questionid)
-if (operation != "none"):
-    excludeddict = {}
-    for line in students: # lastname, firstname, id
-        studentid = line[2]
-        excludeddict[studentid] = ""
+# read one class's files, update groups and write the next conference
+#   options: solver options, from parse_arguments
+#   classfiles: optional index from find_class_files, if already made
+#   returns final penalty, or None if nothing was written
+def update_class(userclass, rosterpath, rosterfile, options, classfiles=None):
+    if (classfiles is None):
+        classfiles = find_class_files(rosterpath, userclass)
+        # every conference and homework file, from one directory listing
+    # parsed files are kept next to the roster (see history_cache.py)
+    if (options.cache):
+        cache = HistoryCache(rosterpath + "astr" + userclass + "_history.npz")
+    else:
+        cache = HistoryCache(None)
+    # check whether roster exists
+    #   if it doesn't, generate message and exit
+    #   if it does, read in the information
     try:
-        homeworkfile = (rosterpath + "astr" + userclass + "_hw" +
-                        str(homeworkcounter) + ".csv")
-        with open(homeworkfile, "r") as homeworkobject:
-            for line in homeworkobject:
-                if (not (line.startswith("#")) and not (line == "")):
-                    linedata = line[:-1].split(",")
-                    # without newline character
-                    for index in range(4):
-                        # lastname, firstname, id, excluded (see top)
-                        linedata[index] = linedata[index].replace("\"", "").strip()
-                        # strip quotation marks, then whitespace
-                    studentid, excludedstr = int(linedata[2]), linedata[3]
-                excludeddict[studentid] = excludedstr
-        print("Homework " + str(homeworkcounter) + " found and read.")
+        roster = cache.read(rosterfile, read_roster)
+        students = []
+        for lastname, firstname, studentid in zip(roster["lastnames"].tolist(),
+                                                  roster["firstnames"].tolist(),
+                                                  roster["ids"].tolist()):
+            students.append([lastname, firstname, studentid])
+            # lastname, firstname, id
+        print("Roster found and read.")
     except:
-        print("Error reading homework. Exiting.")
-        operation = "none"
+        students = []
+        print("Error reading roster. Exiting.")
 
-# update groups
-if (operation != "none"):
-    (updated_assignments,
-     updated_questions) = updategroups(students, associationsdict,
-                                       includeddict, excludeddict,
-                                       questionsdict)
-    # assignments: key = student id, value = group number
-    # groups: key = group number, value = question number
-    for line in priorconferences:
-        # lastname, firstname, id, group(s)/question(s)
-        studentid = line[2]
-        if (studentid in updated_assignments):
-            groupid = updated_assignments[studentid]
-            questionid = updated_questions[groupid]
-            if (studentid not in includeddict):
-                line[3 + conferencecounter * 2] = groupid # indexed from 0
-                line[4 + conferencecounter * 2] = questionid
-    print("Groups updated.")
-    conferencefile = (rosterpath + "astr" + userclass + "_conf" +
-                      str(conferencecounter + 1) + ".csv")
-    with open(conferencefile, "w") as conferenceobject:
-        for line in priorconferences:
-            #write_str = json.dumps(line)[1:-1].replace(", ", ",").replace("\"\"", "") + "\n"
-            # strip brackets
-            # replace empty ' ""'  with ''
-            write_str = (line[0] + ", " + line[1] + ", " + str(line[2]) + ", " +
-                         str(line[3 + conferencecounter * 2]) + ", " +
-                         str(line[4 + conferencecounter * 2]) + "\n")
+    # check whether prior conference data exists
+    #   if it does, fill its columns of the history
+    if students: # evaluates as false if students array is empty
+        conferencecounter = max([0] + list(classfiles["conferences"].keys()))
+        history = ConferenceHistory(students, conferencecounter)
+        # students x conferences x (group, question), plus names
+        # a missing or unreadable conference leaves no groups for it
+        for conferenceiteration in range(1, conferencecounter + 1):
+            try:
+                conferencefile = classfiles["conferences"][conferenceiteration]
+                conference = cache.read(conferencefile, read_conference)
+                history.set_conference(conferenceiteration - 1, # from 0
+                                       conference["ids"].tolist(),
+                                       conference["groups"].tolist(),
+                                       conference["questions"].tolist())
+                print("Conference " + str(conferenceiteration) + " found and read.")
+            except:
+                print("Conference " + str(conferenceiteration) +
+                      " not read. Continuing.")
+        print("Conference " + str(conferencecounter + 1) +
+              " not read. Continuing.")
 
-            conferenceobject.write(write_str)
-    print("Machine-readable file written.")
-    readablefile = (rosterpath + "astr" + userclass + "_conf" +
-                    str(conferencecounter + 1) + "_readable.txt")
-    lastname_char_limit = 31
-    firstname_char_limit = 39 - 5 - lastname_char_limit
-    # 5 chars reserved for formatting
-    printable_names, identical_names, full_names = {}, {}, {}
-    # make sure printable names are unique
-    for line in priorconferences:
-        lastname = line[0]
-        firstname = line[1]
-        studentid = line[2]
-        full_names[studentid] = (lastname, firstname)
-        printable_name = lastname[:lastname_char_limit] + ", " + firstname[0] + "."
-        if (printable_name not in identical_names):
-            identical_names[printable_name] = [studentid]
+    # check which homework data exists
+    # determine whether to create new groups or append existing conference
+    if students: # evaluates as false if students array is empty
+        homeworkcounter = max([0] + list(classfiles["homework"].keys()))
+        # most recent homework, by number
+        if (homeworkcounter == 0):
+            print("No homework found. Exiting.")
+            operation = "none"
         else:
-            identical_names[printable_name].append(studentid)
-    n_initials = 1
-    while (n_initials < firstname_char_limit):
-        n_initials = n_initials + 1
-        remove_names, add_names = [], {}
-        for printable_name in identical_names:
-            if (len(identical_names[printable_name]) != 1):
-                for studentid in identical_names[printable_name]:
-                    lastname, firstname = full_names[studentid]
-                    new_name = lastname[:lastname_char_limit] + ", " + firstname[:n_initials]
-                    if (len(firstname) > n_initials):
-                        new_name = new_name + "."
-                    if (new_name not in add_names):
-                        add_names[new_name] = [studentid]
-                    else:
-                        add_names[new_name].append(studentid)
-                remove_names.append(printable_name)
-        for add_name in add_names:
-            identical_names[add_name] = add_names[add_name]
-            # can't do this while looping through identical_names
-        for removable_name in remove_names:
-            del identical_names[removable_name]
-            # can't do this while looping through identical_names
-        if (len(remove_names) == 0):
-            break
-    for printable_name in identical_names:
-        studentid = identical_names[printable_name][0]
-        printable_names[studentid] = printable_name
-    with open(readablefile, "w") as readableobject:
-        for groupid in sorted(list(updated_questions.keys())):
-            if ((conferencecounter == 4) and # indexed from 0
-                (updated_questions[groupid] == 3)):
-                write_str = "(Group {:d} will choose Question 1 or 2.)".format(groupid).ljust(39, " ") + "\n"
+            print("Most recent homework found: " + str(homeworkcounter))
+            if (homeworkcounter == conferencecounter + 1):
+                operation = "create"
+                print("New groups will be generated for Conference " +
+                      str(homeworkcounter))
+            elif (homeworkcounter == conferencecounter):
+                operation = "update"
+                print("Existing groups will be updated for Conference " +
+                      str(homeworkcounter))
             else:
-                write_str = "(Group {:d} will present Question {:d}.)".format(groupid, updated_questions[groupid]).ljust(39, " ") + "\n"
-            readableobject.write(write_str)
-        for line in priorconferences:
+                operation = "none"
+                print("No action will be taken.")
+    else:
+        operation = "none"
+
+    # generate list of prior associations
+    if (operation != "none"):
+        conference = conferencecounter # being written, indexed from 0
+        if (operation == "update"):
+            conference = conferencecounter - 1 # the last one read
+        (associationsdict, questionsdict,
+         associationstable) = build_associations(history.studentids,
+                                                 history.groups()[:, :conference],
+                                                 history.questions()[:, :conference])
+        # one pass over the history before this conference; also the dense
+        # matrix for the mcmc
+        print("List of prior associations built.")
+
+    # create placeholder for new group if necessary
+    #   otherwise, read existing groups
+    # read homework
+    if (operation == "create"):
+        includeddict = {}
+        history.add_conference() # empty, index conference
+    if (operation == "update"):
+        includeddict = {}
+        for row in range(len(history.studentids)):
+            studentid = history.studentids[row]
+            groupid, questionid = history.cell(row, conference) # from 0
+            if (groupid != ""): # absent students are grouped anew
+                includeddict[studentid] = (groupid, questionid)
+    if (operation != "none"):
+        excludeddict = {}
+        for line in students: # lastname, firstname, id
             studentid = line[2]
-            groupid = line[3 + conferencecounter * 2]
-            if (groupid != ""):
-                write_str = "{:s} {:2d}\n".format(printable_names[studentid].ljust(36, "-"), groupid)
+            excludeddict[studentid] = ""
+        try:
+            homeworkfile = classfiles["homework"][homeworkcounter]
+            homework = cache.read(homeworkfile, read_homework)
+            for studentid, excludedmask in zip(homework["ids"].tolist(),
+                                               homework["excluded"].tolist()):
+                excludeddict[studentid] = excluded_string(excludedmask)
+            print("Homework " + str(homeworkcounter) + " found and read.")
+        except:
+            print("Error reading homework. Exiting.")
+            operation = "none"
+    try:
+        cache.save() # only if a file was parsed
+    except OSError:
+        print("History cache not written. Continuing.")
+
+    # update groups
+    if (operation != "none"):
+        (updated_assignments,
+         updated_questions) = updategroups(students, associationsdict,
+                                           includeddict, excludeddict,
+                                           questionsdict, associationstable,
+                                           mcmc_depth=options.mcmc_depth,
+                                           initial_temperature=options.temperature,
+                                           start=options.start,
+                                           engine=options.engine,
+                                           n_chains=options.chains,
+                                           n_starts=options.starts,
+                                           n_processes=options.processes,
+                                           adaptive_moves=options.adaptive_moves,
+                                           time_budget=options.time_budget,
+                                           stall_window=options.stall_window,
+                                           telemetry_path=options.telemetry,
+                                           headless=options.headless)
+        # assignments: key = student id, value = group number
+        # groups: key = group number, value = question number
+        final_penalty = mcmc_penalty(associationsdict, excludeddict,
+                                     questionsdict, updated_assignments,
+                                     updated_questions)
+        for row in range(len(history.studentids)):
+            studentid = history.studentids[row]
+            if (studentid in updated_assignments):
+                groupid = updated_assignments[studentid]
+                questionid = updated_questions[groupid]
+                if (studentid not in includeddict):
+                    history.set_cell(row, conference, groupid,
+                                     questionid) # indexed from 0
+        print("Groups updated.")
+        conferencefile = (rosterpath + "astr" + userclass + "_conf" +
+                          str(conference + 1) + ".csv")
+        with open(conferencefile, "w") as conferenceobject:
+            for row in range(len(history.studentids)):
+                groupid, questionid = history.cell(row, conference)
+                write_str = (history.lastnames[row] + ", " +
+                             history.firstnames[row] + ", " +
+                             str(history.studentids[row]) + ", " +
+                             str(groupid) + ", " + str(questionid) + "\n")
+                conferenceobject.write(write_str)
+        print("Machine-readable file written.")
+        readablefile = (rosterpath + "astr" + userclass + "_conf" +
+                        str(conference + 1) + "_readable.txt")
+        lastname_char_limit = 31
+        firstname_char_limit = 39 - 5 - lastname_char_limit
+        # 5 chars reserved for formatting
+        printable_names, identical_names, full_names = {}, {}, {}
+        # make sure printable names are unique
+        for row in range(len(history.studentids)):
+            lastname = history.lastnames[row]
+            firstname = history.firstnames[row]
+            studentid = history.studentids[row]
+            full_names[studentid] = (lastname, firstname)
+            printable_name = lastname[:lastname_char_limit] + ", " + firstname[0] + "."
+            if (printable_name not in identical_names):
+                identical_names[printable_name] = [studentid]
+            else:
+                identical_names[printable_name].append(studentid)
+        n_initials = 1
+        while (n_initials < firstname_char_limit):
+            n_initials = n_initials + 1
+            remove_names, add_names = [], {}
+            for printable_name in identical_names:
+                if (len(identical_names[printable_name]) != 1):
+                    for studentid in identical_names[printable_name]:
+                        lastname, firstname = full_names[studentid]
+                        new_name = lastname[:lastname_char_limit] + ", " + firstname[:n_initials]
+                        if (len(firstname) > n_initials):
+                            new_name = new_name + "."
+                        if (new_name not in add_names):
+                            add_names[new_name] = [studentid]
+                        else:
+                            add_names[new_name].append(studentid)
+                    remove_names.append(printable_name)
+            for add_name in add_names:
+                identical_names[add_name] = add_names[add_name]
+                # can't do this while looping through identical_names
+            for removable_name in remove_names:
+                del identical_names[removable_name]
+                # can't do this while looping through identical_names
+            if (len(remove_names) == 0):
+                break
+        for printable_name in identical_names:
+            studentid = identical_names[printable_name][0]
+            printable_names[studentid] = printable_name
+        with open(readablefile, "w") as readableobject:
+            for groupid in sorted(list(updated_questions.keys())):
+                if ((conference == 4) and # indexed from 0
+                    (updated_questions[groupid] == 3)):
+                    write_str = "(Group {:d} will choose Question 1 or 2.)".format(groupid).ljust(39, " ") + "\n"
+                else:
+                    write_str = "(Group {:d} will present Question {:d}.)".format(groupid, updated_questions[groupid]).ljust(39, " ") + "\n"
                 readableobject.write(write_str)
-    print("Human-readable file written.")
+            for row in range(len(history.studentids)):
+                studentid = history.studentids[row]
+                groupid = history.cell(row, conference)[0]
+                if (groupid != ""):
+                    write_str = "{:s} {:2d}\n".format(printable_names[studentid].ljust(36, "-"), groupid)
+                    readableobject.write(write_str)
+        print("Human-readable file written.")
+    if (operation == "none"):
+        return None # nothing written
+    return final_penalty
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# conference history of a class, in columns
+#   one int16 table of students x conferences x (group, question), with
+#   absent where a student was not in a group, and a separate name table
+#   (lastnames, firstnames, ids) in roster order
+#   whole conferences are read and written as columns, so scans over the
+#   history (see prior_associations.py) need no per-student python objects
+# usage:
+#   history = ConferenceHistory(students, n_conferences)
+#   history.set_conference(conference, ids, groups, questions)
+#   groups, questions = history.groups(), history.questions()
+#   groupid, questionid = history.cell(row, conference) # "" if absent
+#   conferences are indexed from 0
+
+import numpy
+
+absent = -1 # no group (or question) in a conference
+
+class ConferenceHistory:
+    def __init__(self, students, n_conferences=0):
+        # students: list of (lastname, firstname, id)
+        self.lastnames = [student[0] for student in students]
+        self.firstnames = [student[1] for student in students]
+        self.studentids = [student[2] for student in students]
+        self.rows = {} # key = student id, value = row (first if repeated)
+        for row in range(len(self.studentids)):
+            if (self.studentids[row] not in self.rows):
+                self.rows[self.studentids[row]] = row
+        self.table = numpy.full((len(self.studentids), n_conferences, 2),
+                                absent, dtype=numpy.int16)
+
+    def n_conferences(self):
+        return self.table.shape[1]
+
+    # add an empty conference at the end, returns its index
+    def add_conference(self):
+        column = numpy.full((len(self.studentids), 1, 2), absent,
+                            dtype=numpy.int16)
+        self.table = numpy.concatenate((self.table, column), axis=1)
+        return self.table.shape[1] - 1
+
+    # fill one conference from the columns of a conference file
+    #   students not on the roster are ignored; the others stay absent
+    def set_conference(self, conference, ids, groups, questions):
+        column = self.table[:, conference]
+        column[:] = absent
+        for studentid, groupid, questionid in zip(ids, groups, questions):
+            if (studentid in self.rows):
+                row = self.rows[studentid]
+                column[row, 0] = groupid
+                column[row, 1] = questionid
+        if (len(self.rows) < len(self.studentids)): # repeated roster ids
+            for row in range(len(self.studentids)):
+                column[row] = column[self.rows[self.studentids[row]]]
+
+    # set one student's group and question in a conference
+    def set_cell(self, row, conference, groupid, questionid):
+        self.table[row, conference, 0] = groupid
+        self.table[row, conference, 1] = questionid
+
+    # (group, question) of one student, or ("", "") if absent
+    def cell(self, row, conference):
+        groupid, questionid = self.table[row, conference].tolist()
+        if (groupid == absent):
+            return ("", "")
+        return (groupid, questionid)
+
+    # students x conferences views, absent where not in a group
+    def groups(self):
+        return self.table[:, :, 0]
+
+    def questions(self):
+        return self.table[:, :, 1]
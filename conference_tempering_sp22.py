@@ -9,20 +9,33 @@
 # homeworkfile = (rosterpath + "astr" + userclass + "_hw" + str(homeworkcounter) + ".csv")
 # conference format: lastname, firstname, id, group, question
 
-# tempering depth and annealing depth specified around line 262
+# tempering depth, annealing depth and temperatures are arguments of
+#   updategroups, or command-line options (see parse_arguments)
 
 # import relevant libraries
 import math
 import random
-from matplotlib import pyplot # for plotting mcmc convergence
+import sys
+import time
+import argparse
 import json
-from copy import deepcopy
-
-# function to merge two dictionaries
-def merge_dictionaries(dict1, dict2):
-    dict3 = dict1.copy()
-    dict3.update(dict2)
-    return dict3
+from group_scoring import GroupScorer # incremental penalty for mcmc moves
+from group_scoring import build_pair_table # prior associations matrix
+from group_scoring import build_question_table # question history and hw
+from group_state import GroupState # array-backed solver state
+from replica_pool import ReplicaPool, fork_available # chains in parallel
+from multichain import MultiChain # lockstep numpy chains
+from convergence_telemetry import PenaltyRecorder # bounded penalty history
+from move_selection import MoveSelector # adaptive move probabilities
+from initial_assignment import initialize_state # balanced, greedy start
+from presolve import presolve # penalty lower bound
+from class_files import read_roster, read_conference, read_homework
+from class_files import excluded_string # homework bitmask as a string
+from class_files import find_class_files # one directory listing
+from history_cache import HistoryCache # parsed files, kept between runs
+from prior_associations import build_associations # one pass
+from conference_history import ConferenceHistory # columnar history
+from best_state import BestState, StopOnInterrupt # anytime best answer
 
 # function to count how many students per group
 def invert_groups(assignments, groups):
@@ -65,81 +78,125 @@ def mcmc_penalty(priorassociations, excludehw, pastdict,
             penalty = penalty + 2 ** max_exponent
     return penalty
 
+# geometric ladder of temperatures, lowest to highest
+def temperature_ladder(n_replicas, lowest=1.0e-2, highest=1.0e+6):
+    if (n_replicas == 1):
+        return [lowest]
+    log_lowest, log_highest = math.log10(lowest), math.log10(highest)
+    log_step = (log_highest - log_lowest) / (n_replicas - 1)
+    return [10 ** (log_lowest + i * log_step) for i in range(n_replicas)]
+
+# respace ladder so adjacent rungs exchange at similar rates
+#   rungs with low acceptance are moved closer together, high ones apart
+#   lowest and highest temperatures stay fixed
+def retune_ladder(temperatures, exchange_attempts, exchange_accepts,
+                  n_iteration):
+    n_gaps = len(temperatures) - 1
+    if (n_gaps < 2):
+        return temperatures
+    rates = [(exchange_accepts[i] + 1.0) / (exchange_attempts[i] + 2.0)
+             for i in range(n_gaps)]
+    mean_rate = sum(rates) / n_gaps
+    step_size = 1.0 / (1.0 + 0.1 * n_iteration) # settles down over the run
+    log_temps = [math.log(temp) for temp in temperatures]
+    gaps = [(log_temps[i + 1] - log_temps[i]) *
+            math.exp(step_size * (rates[i] - mean_rate))
+            for i in range(n_gaps)]
+    scale = (log_temps[-1] - log_temps[0]) / sum(gaps)
+    new_temperatures = [temperatures[0]]
+    log_temp = log_temps[0]
+    for gap in gaps[:-1]:
+        log_temp = log_temp + gap * scale
+        new_temperatures.append(math.exp(log_temp))
+    new_temperatures.append(temperatures[-1])
+    return new_temperatures
+
 # annealing function
-def anneal(temperature, previous_energy, open_assignments, open_groups, depth,
-           open_studentids, open_groupids, group_numbers,
-           protected_assignments, protected_groups, priorassociations,
-           excludehw, pastdict, track_penalties):
-    new_assignments = merge_dictionaries(protected_assignments,
-                                         open_assignments)
-    new_groups = merge_dictionaries(protected_groups, open_groups)
-    penalty_initial = mcmc_penalty(priorassociations, excludehw, pastdict,
-                                   new_assignments, new_groups)
+def anneal(temperature, previous_energy, state, depth, pairtable,
+           questiontable, track_penalties, selector=None, lower_bound=0,
+           deadline=None, best=None):
+    # state is a GroupState, changed in place and returned
+    # selector: optional MoveSelector (move_selection.py), kept across calls;
+    #   without one, the moves are question swaps (20%) and single-student
+    #   moves (80%)
+    # lower_bound: stop once the penalty reaches it (see presolve.py)
+    # deadline: optional time.monotonic() time to stop by
+    # best: optional BestState (best_state.py); keeps a copy of the lowest
+    #   penalty state, and the run stops once best.stop_requested is set
+    scorer = GroupScorer(state, pairtable, questiontable)
+    penalty_initial = scorer.penalty
+    open_students, open_groups = state.open_students, state.open_groups
     n_open_groups = len(open_groups)
+    n_groups = len(state.groupids)
     iteration_history = []
     if (track_penalties == True):
         iteration_history.append(penalty_initial)
+    if (best is not None):
+        best.improve(penalty_initial, state.copy)
     for n_iteration in range(int(depth)):
-        if (penalty_initial == 0):
+        if (penalty_initial <= lower_bound):
             break # no better solution can be found
-        if ((random.random() > 0.8) and (n_open_groups > 1)):
+        if ((best is not None) and best.stop_requested):
+            break # interrupted; best holds the answer so far
+        if ((deadline is not None) and (n_iteration % 100 == 0) and
+            (time.monotonic() >= deadline)):
+            break # out of time
+        if (selector is not None):
+            move = selector.choose(n_open_groups > 1, len(open_students) > 1)
+        elif ((random.random() > 0.8) and (n_open_groups > 1)):
+            move = "swap"
+        else:
+            move = "move"
+        if (move == "swap"):
             # swap two groups' questions
-            groupid1, groupid2 = random.sample(open_groupids, 2)
-            question1, question2 = (open_groups[groupid1],
-                                    open_groups[groupid2])
-            (open_groups[groupid1],
-             open_groups[groupid2]) = question2, question1
-            new_assignments = merge_dictionaries(protected_assignments,
-                                                 open_assignments)
-            new_groups = merge_dictionaries(protected_groups, open_groups)
-            penalty_new = mcmc_penalty(priorassociations, excludehw, pastdict,
-                                       new_assignments, new_groups)
-            #print("question {:f}".format(-(penalty_new - penalty_initial) /
-            #                             temperature))
-            try:
-                acceptance_threshold = min(1.0, math.exp(-(penalty_new -
-                                                           penalty_initial) /
-                                                         temperature))
-            except OverflowError:
-                acceptance_threshold = 1.0
-            if (random.random() < acceptance_threshold): # accept the move
-                penalty_initial = penalty_new
-            else: # reject the move
-                (open_groups[groupid1],
-                 open_groups[groupid2]) = question1, question2
+            group1, group2 = random.sample(open_groups, 2)
+            penalty_new = (penalty_initial +
+                           scorer.propose_swap(group1, group2))
+            # only the two groups' members are rescored
+        elif (move == "trade"):
+            # swap two students between their groups
+            student1, student2 = random.sample(open_students, 2)
+            penalty_new = (penalty_initial +
+                           scorer.propose_trade(student1, student2))
+            # group sizes are unchanged
         else:
             # swap one student's groups
-            studentid1 = random.choice(open_studentids)
-            group1, group2 = (open_assignments[studentid1],
-                              random.choice(group_numbers))
-            open_assignments[studentid1] = group2
-            new_assignments = merge_dictionaries(protected_assignments,
-                                                 open_assignments)
-            new_groups = merge_dictionaries(protected_groups, open_groups)
-            penalty_new = mcmc_penalty(priorassociations, excludehw, pastdict,
-                                       new_assignments, new_groups)
-            #print("group {:f}".format(-(penalty_new - penalty_initial) /
-            #                          temperature))
-            try:
-                acceptance_threshold = min(1.0, math.exp(-(penalty_new -
-                                                           penalty_initial) /
-                                                         temperature))
-            except OverflowError:
-                acceptance_threshold = 1.0
-            if (random.random() < acceptance_threshold): # accept the move
-                penalty_initial = penalty_new
-            else: # reject the move
-                open_assignments[studentid1] = group1
+            student1 = random.choice(open_students)
+            group2 = random.randrange(n_groups)
+            penalty_new = (penalty_initial +
+                           scorer.propose_move(student1, group2))
+            # only the source and destination groups are rescored
+        #print("{:s} {:f}".format(move, -(penalty_new - penalty_initial) /
+        #                         temperature))
+        try:
+            acceptance_threshold = min(1.0, math.exp(-(penalty_new -
+                                                       penalty_initial) /
+                                                     temperature))
+        except OverflowError:
+            acceptance_threshold = 1.0
+        accepted = (random.random() < acceptance_threshold)
+        if (selector is not None):
+            selector.update(move, accepted, penalty_new - penalty_initial)
+        if (accepted): # accept the move
+            penalty_initial = penalty_new
+            scorer.accept()
+            if ((best is not None) and (penalty_initial < best.penalty)):
+                best.improve(penalty_initial, state.copy)
+        # a rejected move leaves nothing to undo
         if (track_penalties == True):
             iteration_history.append(penalty_initial)
         #if (n_iteration % depth / 10 == 0):
         #    print("Finished {:f} annealing iteration {:d} with energy {:d}.".format(temperature, n_iteration + 1, penalty_initial))
-    return [temperature, penalty_initial, open_assignments, open_groups,
-            depth, iteration_history]
+    return [temperature, penalty_initial, state, depth, iteration_history]
 
 # mcmc
 def updategroups(studentslist, priorassociations, includegroup, excludehw,
-                 pastdict):
+                 pastdict, pairtable=None, tempering_depth=int(1e+1),
+                 annealing_depth=int(1e+3), temperatures=None, start="greedy",
+                 parallel=False, n_replicas=5,
+                 adaptive_ladder=False, engine="python", adaptive_moves=False,
+                 time_budget=None, stall_window=None, telemetry_path=None,
+                 headless=False, best=None):
     # list of students (lastname, firstname, id)
     # dictionary of prior associations
     #   key = student id, value = list including multiples
@@ -149,7 +206,36 @@ def updategroups(studentslist, priorassociations, includegroup, excludehw,
     #   key = student id, value = string (detailed above)
     # dictionary of which questions assigned in past conferences
     #   key = student id, value = list
+    # matrix of prior associations, from build_pair_table (optional)
+    # number of exchange rounds
+    # number of annealing iterations per chain per round
+    # list of temperatures, one per chain (default temperature_ladder)
+    # start: "random" groups, "balanced" sizes, or "greedy" (balanced sizes,
+    #   each student placed where they add the least penalty), per chain
+    # whether to run each chain in its own worker process
+    # number of chains (replicas), if temperatures not given
+    # whether to respace temperatures during the run
+    # engine: "python" (one anneal() per chain) or "numpy" (all in lockstep)
+    #   numpy has a fixed cost per step, so it only pays off with many
+    #   replicas (about 16 or more)
+    # adaptive_moves: add student trades and adapt move probabilities, one
+    #   MoveSelector per chain (python engine only)
+    # time_budget: optional, seconds for the mcmc
+    # stall_window: optional, stop after this many tempering iterations
+    #   (exchanges) without a new lowest penalty
+    # telemetry_path: optional JSONL file to stream convergence summaries to
+    # headless: skip the convergence plot (matplotlib is never imported)
+    # best: optional BestState, for reading the best groups so far from
+    #   another thread or stopping early (Ctrl-C also stops early)
     track_penalties = True # for graphing convergence
+    if (best is None):
+        best = BestState()
+    deadline = None
+    if (time_budget is not None):
+        deadline = time.monotonic() + time_budget
+    telemetry_stream = None
+    if ((track_penalties == True) and (telemetry_path is not None)):
+        telemetry_stream = open(telemetry_path, "w")
     n_credit = 0
     protected_assignments, open_assignments = {}, {}
     protected_groups, open_groups, existing_groups = {}, {}, {}
@@ -260,408 +346,574 @@ def updategroups(studentslist, priorassociations, includegroup, excludehw,
     # choose whether to change one student's group or two groups' questions
     # calculate penalty
     # remember to break if penalty = 0
-    open_studentids = list(open_assignments.keys())
-    open_groupids = list(open_groups.keys())
-    tempering_depth, annealing_depth = int(1e+1), int(1e+3)
+    if (pairtable is None): # build once, shared by all chains
+        pairtable = build_pair_table(list(priorassociations.keys()),
+                                     priorassociations)
+    questiontable = build_question_table(pairtable[0], excludehw, pastdict,
+                                         [0] + open_questions +
+                                         list(protected_groups.values()))
+    # compiled once, so each student's question costs one table read
     # initialize annealing states
-    temperatures = [10 ** i for i in range(-2, 7, 2)]
+    if (temperatures is None):
+        temperatures = temperature_ladder(n_replicas)
+        # lowest to highest, default 10 ** -2, 10 ** 0, ..., 10 ** 6
+    else:
+        temperatures = sorted(temperatures) # lowest to highest
+        n_replicas = len(temperatures)
     #temperatures = [1.0e+10 * (0.25 * i) + 1.0e+5 for i in range(5)]
-    annealing_assignments = [{}, {}, {}, {}, {}]
-    annealing_groups = [{}, {}, {}, {}, {}]
-    annealed_output = [None, None, None, None, None]
-    acceptances = [None, None, None, None, None]
+    annealing_assignments = [{} for i in range(n_replicas)]
+    annealing_groups = [{} for i in range(n_replicas)]
+    annealed_output = [None] * n_replicas
     # note to self: "[[]] * 5" produces only shallow copies
+    replica_rungs = list(range(n_replicas)) # ladder position of each chain
+    exchange_attempts = [0] * (n_replicas - 1) # per pair of adjacent rungs
+    exchange_accepts = [0] * (n_replicas - 1)
     if (track_penalties == True):
-        penalty_history = {}
-        for temp_index in range(5):
-            penalty_history[temperatures[temp_index]] = []
-    for anneal_index in range(5):
+        penalty_history = {} # key = rung, value = PenaltyRecorder
+        for rung in range(n_replicas):
+            penalty_history[rung] = PenaltyRecorder(stream=telemetry_stream,
+                                                    label=rung)
+    for anneal_index in range(n_replicas):
         # randomly assign open students to open groups
         for studentid in open_assignments:
-            annealing_assignments[anneal_index][studentid] = random.choice(group_numbers) # key = studentid, value = groupid
-            # may result in groups with fewer than 4 or more than 5 students
+            if (start == "random"):
+                annealing_assignments[anneal_index][studentid] = random.choice(group_numbers) # key = studentid, value = groupid
+                # may result in groups with fewer than 4 or more than 5 students
+            else:
+                annealing_assignments[anneal_index][studentid] = group_numbers[0]
+                # placeholder, replaced by initialize_state
         # randomly assign open questions to open groups
         random.shuffle(open_questions)
         for pair in zip(list(open_groups.keys()), open_questions):
             annealing_groups[anneal_index][pair[0]] = pair[1] # key = groupid, value = questionid
         annealed_output[anneal_index] = [temperatures[anneal_index],
                                          None, # placeholder for energy
-                                         annealing_assignments[anneal_index],
-                                         annealing_groups[anneal_index],
+                                         GroupState(pairtable[0],
+                                                    protected_assignments,
+                                                    annealing_assignments[anneal_index],
+                                                    protected_groups,
+                                                    annealing_groups[anneal_index]),
                                          annealing_depth]
-    for n_iteration in range(int(tempering_depth)):
-        for temp_index in range(5):
-            annealed_output[temp_index] = anneal(annealed_output[temp_index][0],
-                                                 annealed_output[temp_index][1],
-                                                 annealed_output[temp_index][2],
-                                                 annealed_output[temp_index][3],
-                                                 annealed_output[temp_index][4],
-                                                 open_studentids,
-                                                 open_groupids,
-                                                 group_numbers,
-                                                 protected_assignments,
-                                                 protected_groups,
-                                                 priorassociations, excludehw,
-                                                 pastdict,
-                                                 track_penalties)
-            # returns: temp, energy, assignments, groups, depth, history
+        initialize_state(annealed_output[anneal_index][2], pairtable,
+                         questiontable, start)
+    lower_bound, presolve_notes = presolve(annealed_output[0][2],
+                                           pairtable, questiontable)
+    # the mcmc stops once this penalty is reached
+    best.lower_bound = lower_bound
+    for note in presolve_notes:
+        print(note)
+    if (lower_bound > 0):
+        print("Lowest possible penalty: {:d}".format(lower_bound))
+    if (parallel and (engine == "numpy")):
+        print("Lockstep chains run in one process. Ignoring parallel.")
+        parallel = False
+    if (adaptive_moves and (engine == "numpy")):
+        print("Lockstep chains use fixed moves. Ignoring adaptive_moves.")
+        adaptive_moves = False
+    if (adaptive_moves):
+        selectors = [MoveSelector() for i in range(n_replicas)]
+        # each stays with its chain's state, not its temperature
+    else:
+        selectors = [None] * n_replicas
+    if (parallel and (not fork_available())):
+        print("Worker processes not available. Running chains in series.")
+        parallel = False
+    with StopOnInterrupt(best): # workers forked inside inherit it
+        if (parallel): # each chain keeps its state in a persistent worker
+            pool = ReplicaPool(anneal, [output[2] for output in annealed_output],
+                               annealing_depth, pairtable, questiontable,
+                               track_penalties, selectors, lower_bound,
+                               deadline, best)
+        if (engine == "numpy"): # all chains advance together
+            chains = MultiChain([output[2] for output in annealed_output],
+                                pairtable, questiontable)
+        energy_lowest, n_lowest = None, 0 # for stall_window
+        for n_iteration in range(int(tempering_depth)):
+            if (engine == "numpy"):
+                if (track_penalties == True):
+                    chain_recorders = [penalty_history[rung] for rung in replica_rungs]
+                    # recorded directly, by rung
+                else:
+                    chain_recorders = None
+                chain_energies = chains.anneal([output[0] for output in annealed_output],
+                                               annealing_depth,
+                                               recorders=chain_recorders,
+                                               lower_bound=lower_bound,
+                                               deadline=deadline, best=best)
+                for temp_index in range(n_replicas):
+                    annealed_output[temp_index] = [annealed_output[temp_index][0],
+                                                   chain_energies[temp_index],
+                                                   annealed_output[temp_index][2],
+                                                   annealing_depth, []]
+                    # states are written back at the end
+            elif (parallel):
+                pool_output = pool.run([output[0] for output in annealed_output])
+                # returns: temp, energy, history, best penalty for each chain
+                for temp_index in range(n_replicas):
+                    annealed_output[temp_index] = [pool_output[temp_index][0],
+                                                   pool_output[temp_index][1],
+                                                   annealed_output[temp_index][2],
+                                                   annealing_depth,
+                                                   pool_output[temp_index][2]]
+                    # state stays in the worker until the end
+                    best.improve(pool_output[temp_index][3],
+                                 lambda: pool.best_state(temp_index))
+                    # fetched only when a worker has beaten the best so far
+            else:
+                for temp_index in range(n_replicas):
+                    annealed_output[temp_index] = anneal(annealed_output[temp_index][0],
+                                                         annealed_output[temp_index][1],
+                                                         annealed_output[temp_index][2],
+                                                         annealed_output[temp_index][3],
+                                                         pairtable, questiontable,
+                                                         track_penalties,
+                                                         selectors[temp_index],
+                                                         lower_bound, deadline,
+                                                         best)
+                    # returns: temp, energy, state, depth, history
             if (track_penalties == True):
-                iteration_history = annealed_output[temp_index][5]
-                iteration_temp = annealed_output[temp_index][0]
-                penalty_history[iteration_temp].extend(iteration_history)
-                trunc_history = annealing_depth - len(iteration_history)
-                if (trunc_history > 0):
-                    iteration_history = [float("nan")] * trunc_history
-                    penalty_history[iteration_temp].extend(iteration_history)
-        annealed_temps = [output[0] for output in annealed_output]
-        annealed_energies = [output[1] for output in annealed_output]
-        if (min(annealed_energies) == 0):
-            print("Optimal solution found after tempering iteration {:d}.".format(n_iteration + 1))
-            break # no better solution to be found
-        #for temp_index in range(5):
-        #    try:
-        #        acceptances[temp_index] = min(1.0, math.exp((1.0 / annealed_temps[temp_index] - 1.0 / annealed_temps[(temp_index + 1) % 5]) * -(annealed_energies[temp_index] - annealed_energies[(temp_index + 1) % 5])))
-        #    except OverflowError:
-        #        acceptances[temp_index] = 1.0
-        #for accept_index in range(5):
-        #    if (random.random() < acceptances[accept_index]):
-        #        temp1 = annealed_output[accept_index][0]
-        #        temp2 = annealed_output[(accept_index + 1) % 5][0]
-        #        annealed_output[accept_index][0] = temp2
-        #        annealed_output[(accept_index + 1) % 5][0] = temp1
-        #        break # don't exchange more than two chains at once
-        for temp_index in range(5):
-            try:
-                acceptance_value = min(1.0, math.exp((1.0 / annealed_temps[temp_index] - 1.0 / annealed_temps[(temp_index + 1) % 5]) * -(annealed_energies[temp_index] - annealed_energies[(temp_index + 1) % 5])))
-            except OverflowError:
-                acceptance_value = 1.0
-            if (random.random() < acceptance_value):
-                # swap temperature with next adjacent chain
-                temp1 = annealed_output[temp_index][0]
-                temp2 = annealed_output[(temp_index + 1) % 5][0]
-                annealed_output[temp_index][0] = temp2
-                annealed_output[(temp_index + 1) % 5][0] = temp1
-                # swap energy with next adjacent chain
-                energy1 = annealed_output[temp_index][1]
-                energy2 = annealed_output[(temp_index + 1) % 5][1]
-                annealed_output[temp_index][1] = energy2
-                annealed_output[(temp_index + 1) % 5][1] = energy1
-                # update quick views
-                annealed_temps = [output[0] for output in annealed_output]
-                annealed_energies = [output[1] for output in annealed_output]
-        if (n_iteration % (tempering_depth / 10) == 0):
-            print("Finished tempering iteration {:d}.".format(n_iteration + 1))
-    tempered_energies = [output[1] for output in annealed_output]
-    min_energy = min(tempered_energies)
-    min_index = tempered_energies.index(min_energy)
-    open_assignments = annealed_output[min_index][2]
-    open_groups = annealed_output[min_index][3]
+                round_end = (n_iteration + 1) * (int(annealing_depth) + 1)
+                # initial penalty plus one per annealing iteration
+                for temp_index in range(n_replicas):
+                    recorder = penalty_history[replica_rungs[temp_index]]
+                    recorder.extend(annealed_output[temp_index][4])
+                    recorder.skip(round_end - recorder.n_iterations)
+                    # chains that stopped early leave a gap
+            annealed_temps = [output[0] for output in annealed_output]
+            annealed_energies = [output[1] for output in annealed_output]
+            if (best.stop_requested):
+                break # interrupted
+            if (min(annealed_energies) <= lower_bound):
+                print("Optimal solution found after tempering iteration {:d}.".format(n_iteration + 1))
+                break # no better solution to be found
+            if ((energy_lowest is None) or
+                (min(annealed_energies) < energy_lowest)):
+                energy_lowest, n_lowest = min(annealed_energies), n_iteration
+            elif ((stall_window is not None) and
+                  (n_iteration - n_lowest >= stall_window)):
+                print("No improvement in {:d} tempering iterations.".format(int(stall_window)))
+                break
+            if ((deadline is not None) and (time.monotonic() >= deadline)):
+                print("Time budget used after tempering iteration {:d}.".format(n_iteration + 1))
+                break
+            if (adaptive_ladder):
+                # exchange between adjacent rungs of the ladder
+                # only temperatures move; energies stay with their states
+                for rung in range(n_replicas - 1):
+                    temp_index1 = replica_rungs.index(rung)
+                    temp_index2 = replica_rungs.index(rung + 1)
+                    try:
+                        acceptance_value = min(1.0, math.exp((1.0 / annealed_temps[temp_index1] - 1.0 / annealed_temps[temp_index2]) * -(annealed_energies[temp_index1] - annealed_energies[temp_index2])))
+                    except OverflowError:
+                        acceptance_value = 1.0
+                    exchange_attempts[rung] = exchange_attempts[rung] + 1
+                    if (random.random() < acceptance_value):
+                        exchange_accepts[rung] = exchange_accepts[rung] + 1
+                        (annealed_output[temp_index1][0],
+                         annealed_output[temp_index2][0]) = (annealed_temps[temp_index2],
+                                                             annealed_temps[temp_index1])
+                        (replica_rungs[temp_index1],
+                         replica_rungs[temp_index2]) = rung + 1, rung
+                        annealed_temps = [output[0] for output in annealed_output]
+                # respace the ladder toward uniform exchange acceptance
+                temperatures = retune_ladder(temperatures, exchange_attempts,
+                                             exchange_accepts, n_iteration)
+                for temp_index in range(n_replicas):
+                    annealed_output[temp_index][0] = temperatures[replica_rungs[temp_index]]
+            else:
+                #for temp_index in range(5):
+                #    try:
+                #        acceptances[temp_index] = min(1.0, math.exp((1.0 / annealed_temps[temp_index] - 1.0 / annealed_temps[(temp_index + 1) % 5]) * -(annealed_energies[temp_index] - annealed_energies[(temp_index + 1) % 5])))
+                #    except OverflowError:
+                #        acceptances[temp_index] = 1.0
+                #for accept_index in range(5):
+                #    if (random.random() < acceptances[accept_index]):
+                #        temp1 = annealed_output[accept_index][0]
+                #        temp2 = annealed_output[(accept_index + 1) % 5][0]
+                #        annealed_output[accept_index][0] = temp2
+                #        annealed_output[(accept_index + 1) % 5][0] = temp1
+                #        break # don't exchange more than two chains at once
+                for temp_index in range(n_replicas):
+                    next_index = (temp_index + 1) % n_replicas
+                    try:
+                        acceptance_value = min(1.0, math.exp((1.0 / annealed_temps[temp_index] - 1.0 / annealed_temps[next_index]) * -(annealed_energies[temp_index] - annealed_energies[next_index])))
+                    except OverflowError:
+                        acceptance_value = 1.0
+                    if (random.random() < acceptance_value):
+                        # swap temperature with next adjacent chain
+                        temp1 = annealed_output[temp_index][0]
+                        temp2 = annealed_output[next_index][0]
+                        annealed_output[temp_index][0] = temp2
+                        annealed_output[next_index][0] = temp1
+                        (replica_rungs[temp_index],
+                         replica_rungs[next_index]) = (replica_rungs[next_index],
+                                                       replica_rungs[temp_index])
+                        # swap energy with next adjacent chain
+                        energy1 = annealed_output[temp_index][1]
+                        energy2 = annealed_output[next_index][1]
+                        annealed_output[temp_index][1] = energy2
+                        annealed_output[next_index][1] = energy1
+                        # update quick views
+                        annealed_temps = [output[0] for output in annealed_output]
+                        annealed_energies = [output[1] for output in annealed_output]
+            if (n_iteration % (tempering_depth / 10) == 0):
+                print("Finished tempering iteration {:d}.".format(n_iteration + 1))
+    if (parallel):
+        pool.close()
+    if (engine == "numpy"):
+        chains.write_states()
+    # the chains keep moving after their lowest penalty (and exchanges move
+    # energies between them), so the best state seen is returned
+    min_energy = best.penalty
+    if (telemetry_stream is not None):
+        for rung in range(n_replicas):
+            penalty_history[rung].flush()
+        telemetry_stream.close()
     # structure return data
-    return_assignments = merge_dictionaries(protected_assignments,
-                                            open_assignments)
-    return_groups = merge_dictionaries(protected_groups, open_groups)
+    return_assignments, return_groups = best.state.to_dicts()
     if (track_penalties == True):
-        pyplot.ion()
-        for n_chain in range(5):
-            chain_temp = temperatures[4 - n_chain] # high to low
-            chain_history = penalty_history[chain_temp]
-            annealing_steps = [i for i in range(len(chain_history))]
-            n_alpha = n_chain * 0.2 + 0.1 # 0.1, 0.3, 0.5, 0.7, 0.9
-            legend_str = "{:d}".format(4 - n_chain + 1)
-            pyplot.plot(annealing_steps, chain_history, "-", alpha=n_alpha,
-                        label=legend_str)
-            # solid lines, no markers
-        pyplot.legend()
-        pyplot.show()
+        if (not headless):
+            from matplotlib import pyplot # only imported when plotting
+            pyplot.ion()
+            for n_chain in range(n_replicas):
+                chain_rung = n_replicas - 1 - n_chain # high to low
+                iterations, mins, means, maxs = penalty_history[chain_rung].columns()
+                # min, mean and max per window of iterations
+                n_alpha = 0.1 + 0.8 * n_chain / max(1, n_replicas - 1)
+                # 0.1 to 0.9, e.g. 0.1, 0.3, 0.5, 0.7, 0.9
+                legend_str = "{:d}".format(chain_rung + 1)
+                pyplot.plot(iterations, means, "-", alpha=n_alpha,
+                            label=legend_str)
+                # solid lines, no markers
+            pyplot.legend()
+            pyplot.show()
         print("Final MCMC penalty: {:d}".format(min_energy))
+        if (adaptive_ladder):
+            print("Final temperature ladder: " +
+                  ", ".join(["{:.3g}".format(temp) for temp in temperatures]))
         inverse_groups = invert_groups(return_assignments, return_groups)
         for groupid in inverse_groups:
             print("Students in Group {:d}: {:d}".format(groupid, len(inverse_groups[groupid])))
     return (return_assignments, return_groups)
 
-# get path data from user
-userclass = input("Please enter the class name. \nastr")
-rosterpath = "astr" + userclass + "/"
-rostername = "astr" + userclass + "_roster_conferences_csv.csv"
-print("The default roster path is: " + rosterpath)
-userpath = input("Specify the roster path if different from default. ")
-if (userpath != ""):
-    rosterpath = userpath
-if (not (rosterpath.endswith("/"))): # append "/" to path if necessary
-    rosterpath = rosterpath + "/"
-print("The default roster file is: " + rostername)
-userfile = input("Specify the roster file if different from default. ")
-if (userfile != ""):
-    rostername = userfile
-rosterfile = rosterpath + rostername
-print("The roster file to be checked is: " + rosterfile)
-
-# check whether roster exists
-#   if it doesn't, generate message and exit
-#   if it does, read in the information
-try:
-    students = []
-    with open(rosterfile, "r") as rosterobject:
-        for line in rosterobject:
-            if (not (line.startswith("#")) and not (line == "")):
-                if (line[-1] == "\n"):
-                    linedata = line[:-1].split(",") # without newline character
-                else:
-                    linedata = line.split(",")
-                for index in range(3): # lastname, firstname, id
-                    linedata[index] = linedata[index].replace("\"", "").strip()
-                    # strip quotation marks, then whitespace
-                students.append(linedata[:2]) # lastname, firstname, id
-                students[-1].append(int(linedata[2]))
-    print("Roster found and read.")
-    #print(students)
-except:
-    students = []
-    print("Error reading roster. Exiting.")
+# command-line options
+#   without a class name, main() prompts for the class, path and file
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Assign students to "
+                                     "conference groups by parallel "
+                                     "tempering.")
+    parser.add_argument("userclass", nargs="?",
+                        help="class name, without the leading astr")
+    parser.add_argument("--path", dest="rosterpath",
+                        help="roster path (default: astr + class name)")
+    parser.add_argument("--roster", dest="rostername",
+                        help="roster file name in the roster path")
+    parser.add_argument("--tempering-depth", type=float, default=1e+1,
+                        help="number of exchange rounds")
+    parser.add_argument("--annealing-depth", type=float, default=1e+3,
+                        help="annealing iterations per chain per round")
+    parser.add_argument("--temperatures", type=float, nargs="+",
+                        help="one temperature per chain")
+    parser.add_argument("--replicas", type=int, default=5,
+                        help="number of chains, if --temperatures not given")
+    parser.add_argument("--adaptive-ladder", action="store_true",
+                        help="respace temperatures during the run")
+    parser.add_argument("--start", choices=["random", "balanced", "greedy"],
+                        default="greedy", help="starting assignment")
+    parser.add_argument("--engine", choices=["python", "numpy"],
+                        default="python",
+                        help="numpy runs all replicas in lockstep; it is "
+                        "slower than python below about 16 replicas")
+    parser.add_argument("--adaptive-moves", action="store_true",
+                        help="add student trades and adapt move "
+                        "probabilities")
+    parser.add_argument("--parallel", action="store_true",
+                        help="run each chain in its own worker process")
+    parser.add_argument("--time-budget", type=float,
+                        help="seconds for the mcmc")
+    parser.add_argument("--stall-window", type=int,
+                        help="stop after this many tempering iterations "
+                        "without improvement")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="parse every file, without the history cache")
+    parser.add_argument("--seed", type=int,
+                        help="random seed, for reproducible runs")
+    parser.add_argument("--telemetry",
+                        help="JSONL file for convergence summaries")
+    parser.add_argument("--headless", action="store_true",
+                        help="do not plot convergence")
+    return parser.parse_args(argv)
 
-# check whether prior conference data exists
-#   if it does, append to priorconferences array
-if students: # evaluates as false if students array is empty
-    priorconferences = deepcopy(students) # will be appended with group numbers
-    conferencecounter = 1
-    conferencefound = True
-    while conferencefound:
-        try:
-            conferencefile = (rosterpath + "astr" + userclass + "_conf" +
-                              str(conferencecounter) + ".csv")
-            #print(conferencefile)
-            with open(conferencefile, "r") as conferenceobject:
-                conferencedict = {}
-                posterdict = {}
-                for line in conferenceobject:
-                    if (not (line.startswith("#")) and not (line == "")):
-                        linedata = line[:-1].split(",")
-                        # without newline character
-                        for index in range(5):
-                            # lastname, firstname, id, group, question
-                            linedata[index] = linedata[index].replace("\"", "").strip()
-                            # strip quotation marks, then whitespace
-                        studentid = int(linedata[2])
-                        if (linedata[3] != ""):
-                            studentgroup = int(linedata[3])
-                            questionid = int(linedata[4])
-                            conferencedict[studentid] = studentgroup
-                            posterdict[studentid] = questionid
-                        #else:
-                        #    conferencedict[studentid] = ""
-                        #    posterdict[studentid] = ""
-                for line in priorconferences: # lastname, firstname, id
-                    studentid = line[2]
-                    if (studentid in conferencedict):
-                        line.extend([conferencedict[studentid],
-                                     posterdict[studentid]])
-                    else:
-                        line.extend(["", ""])
-                        # lastname, firstname, id, group(s)/question(s)
-            print("Conference " + str(conferencecounter) + " found and read.")
-            conferencecounter = conferencecounter + 1
-        #except Exception as inst:
-        #    print(type(inst))
-        #    print(inst.args)
-        #    print(inst)
-        except:
-            print("Conference " + str(conferencecounter) +
-                  " not read. Continuing.")
-            conferencecounter = conferencecounter - 1
-            conferencefound = False
-
-# check which homework data exists
-# determine whether to create new groups or append existing conference
-if students: # evaluates as false if students array is empty
-    homeworkcounter = 0
-    homeworkfound = True
-    while homeworkfound:
-        try:
-            homeworkcounter = homeworkcounter + 1
-            homeworkfile = (rosterpath + "astr" + userclass + "_hw" +
-                            str(homeworkcounter) + ".csv")
-            with open(homeworkfile, "r") as homeworkobject:
-                pass
-        except:
-            homeworkcounter = homeworkcounter - 1
-            homeworkfound = False
-    if (homeworkcounter == 0):
-        print("No homework found. Exiting.")
-        operation = "none"
+# prompt for or parse the class, then update its groups
+#   argv: command-line arguments (default sys.argv[1:])
+#   returns exit status: 0 if groups were written, 1 otherwise
+def main(argv=None):
+    options = parse_arguments(argv)
+    interactive = (options.userclass is None) # prompt for what is not given
+    if (options.seed is not None):
+        random.seed(options.seed)
+    # get path data from user
+    if (interactive):
+        userclass = input("Please enter the class name. \nastr")
     else:
-        print("Most recent homework found: " + str(homeworkcounter))
-        if (homeworkcounter == conferencecounter + 1):
-            operation = "create"
-            print("New groups will be generated for Conference " +
-                  str(homeworkcounter))
-        elif (homeworkcounter == conferencecounter):
-            operation = "update"
-            print("Existing groups will be updated for Conference " +
-                  str(homeworkcounter))
-        else:
-            operation = "none"
-            print("No action will be taken.")
-else:
-    operation = "none"
+        userclass = options.userclass
+    rosterpath = "astr" + userclass + "/"
+    rostername = "astr" + userclass + "_roster_conferences_csv.csv"
+    print("The default roster path is: " + rosterpath)
+    if (options.rosterpath is not None):
+        userpath = options.rosterpath
+    elif (interactive):
+        userpath = input("Specify the roster path if different from default. ")
+    else:
+        userpath = ""
+    if (userpath != ""):
+        rosterpath = userpath
+    if (not (rosterpath.endswith("/"))): # append "/" to path if necessary
+        rosterpath = rosterpath + "/"
+    print("The default roster file is: " + rostername)
+    if (options.rostername is not None):
+        userfile = options.rostername
+    elif (interactive):
+        userfile = input("Specify the roster file if different from default. ")
+    else:
+        userfile = ""
+    if (userfile != ""):
+        rostername = userfile
+    rosterfile = rosterpath + rostername
+    print("The roster file to be checked is: " + rosterfile)
+    final_penalty = update_class(userclass, rosterpath, rosterfile, options)
+    if (final_penalty is None):
+        return 1 # nothing written
+    return 0
 
-# generate list of prior associations
-if (operation != "none"):
-    associationsdict, questionsdict = {}, {}
-    # for each student, create a set of prior partners
-    for line in students: # lastname, firstname, id
-        studentid = line[2]
-        associationsdict[studentid] = []
-        questionsdict[studentid] = []
-    for conferenceiteration in range(conferencecounter):
-        groupiteration = 1
-        groupfound = True
-        while groupfound:
-            group = set()
-            for line in priorconferences: # lastname, firstname, id, group(s)/question(s)
-                studentid = line[2]
-                groupid = line[3 + conferenceiteration * 2] # indexed from 0
-                if (groupid == groupiteration):
-                    group.add(studentid)
-                    questionid = line[4 + conferenceiteration * 2]
-            for studentid in group:
-                associationsdict[studentid] = associationsdict[studentid] + list(group.difference(set((studentid,))))
-                questionsdict[studentid] = questionsdict[studentid] + list((questionid,))
-            if (len(group) > 0):
-                groupiteration = groupiteration + 1
-            else:
-                groupfound = False
-    print("List of prior associations built.")
-            
-# create placeholder for new group if necessary
-#   otherwise, read existing groups
-# read homework
-if (operation == "create"):
-    includeddict = {}
-    for line in priorconferences: # lastname, firstname, id, group(s)/question(s)
-        line.extend(["", ""])
-        #studentid = line[2]
-        #includeddict[studentid] = ("", "")
-if (operation == "update"):
-    includeddict = {}
-    for line in priorconferences: # lastname, firstname, id, group(s)/question(s)
-        studentid = line[2]
-        groupid = line[3 + conferencecounter * 2] # indexed from 0
-        questionid = line[4 + conferencecounter * 2]
-        includeddict[studentid] = (groupid, questionid)
-if (operation != "none"):
-    excludeddict = {}
-    for line in students: # lastname, firstname, id
-        studentid = line[2]
-        excludeddict[studentid] = ""
+# read one class's files, update groups and write the next conference
+#   options: solver options, from parse_arguments
+#   classfiles: optional index from find_class_files, if already made
+#   returns final penalty, or None if nothing was written
+def update_class(userclass, rosterpath, rosterfile, options, classfiles=None):
+    if (classfiles is None):
+        classfiles = find_class_files(rosterpath, userclass)
+        # every conference and homework file, from one directory listing
+    # parsed files are kept next to the roster (see history_cache.py)
+    if (options.cache):
+        cache = HistoryCache(rosterpath + "astr" + userclass + "_history.npz")
+    else:
+        cache = HistoryCache(None)
+    # check whether roster exists
+    #   if it doesn't, generate message and exit
+    #   if it does, read in the information
     try:
-        homeworkfile = (rosterpath + "astr" + userclass + "_hw" +
-                        str(homeworkcounter) + ".csv")
-        with open(homeworkfile, "r") as homeworkobject:
-            for line in homeworkobject:
-                if (not (line.startswith("#")) and not (line == "")):
-                    if line.endswith("\n"):
-                        linedata = line[:-1].split(",")
-                        # without newline character
-                    else:
-                        linedata = line.split(",")
-                        # don't leave out last student if doesn't end with blank line
-                    for index in range(4):
-                        # lastname, firstname, id, excluded (see top)
-                        linedata[index] = linedata[index].replace("\"", "").strip()
-                        # strip quotation marks, then whitespace
-                    studentid, excludedstr = int(linedata[2]), linedata[3]
-                excludeddict[studentid] = excludedstr
-        print("Homework " + str(homeworkcounter) + " found and read.")
+        roster = cache.read(rosterfile, read_roster)
+        students = []
+        for lastname, firstname, studentid in zip(roster["lastnames"].tolist(),
+                                                  roster["firstnames"].tolist(),
+                                                  roster["ids"].tolist()):
+            students.append([lastname, firstname, studentid])
+            # lastname, firstname, id
+        print("Roster found and read.")
+        #print(students)
     except:
-        print("Error reading homework. Exiting.")
-        operation = "none"
+        students = []
+        print("Error reading roster. Exiting.")
 
-# update groups
-if (operation != "none"):
-    (updated_assignments,
-     updated_questions) = updategroups(students, associationsdict,
-                                       includeddict, excludeddict,
-                                       questionsdict)
-    # assignments: key = student id, value = group number
-    # groups: key = group number, value = question number
-    for line in priorconferences:
-        # lastname, firstname, id, group(s)/question(s)
-        studentid = line[2]
-        if (studentid in updated_assignments):
-            groupid = updated_assignments[studentid]
-            questionid = updated_questions[groupid]
-            if (studentid not in includeddict):
-                line[3 + conferencecounter * 2] = groupid # indexed from 0
-                line[4 + conferencecounter * 2] = questionid
-    print("Groups updated.")
-    conferencefile = (rosterpath + "astr" + userclass + "_conf" +
-                      str(conferencecounter + 1) + ".csv")
-    with open(conferencefile, "w") as conferenceobject:
-        for line in priorconferences:
-            #write_str = json.dumps(line)[1:-1].replace(", ", ",").replace("\"\"", "") + "\n"
-            # strip brackets
-            # replace empty ' ""'  with ''
-            write_str = (line[0] + ", " + line[1] + ", " + str(line[2]) + ", " +
-                         str(line[3 + conferencecounter * 2]) + ", " +
-                         str(line[4 + conferencecounter * 2]) + "\n")
-            conferenceobject.write(write_str)
-    print("Machine-readable file written.")
-    readablefile = (rosterpath + "astr" + userclass + "_conf" +
-                    str(conferencecounter + 1) + "_readable.txt")
-    lastname_char_limit = 31
-    firstname_char_limit = 39 - 5 - lastname_char_limit
-    # 5 chars reserved for formatting
-    printable_names, identical_names, full_names = {}, {}, {}
-    # make sure printable names are unique
-    for line in priorconferences:
-        lastname = line[0]
-        firstname = line[1]
-        studentid = line[2]
-        full_names[studentid] = (lastname, firstname)
-        printable_name = lastname[:lastname_char_limit] + ", " + firstname[0] + "."
-        if (printable_name not in identical_names):
-            identical_names[printable_name] = [studentid]
+    # check whether prior conference data exists
+    #   if it does, fill its columns of the history
+    if students: # evaluates as false if students array is empty
+        conferencecounter = max([0] + list(classfiles["conferences"].keys()))
+        history = ConferenceHistory(students, conferencecounter)
+        # students x conferences x (group, question), plus names
+        # a missing or unreadable conference leaves no groups for it
+        for conferenceiteration in range(1, conferencecounter + 1):
+            try:
+                conferencefile = classfiles["conferences"][conferenceiteration]
+                conference = cache.read(conferencefile, read_conference)
+                history.set_conference(conferenceiteration - 1, # from 0
+                                       conference["ids"].tolist(),
+                                       conference["groups"].tolist(),
+                                       conference["questions"].tolist())
+                print("Conference " + str(conferenceiteration) + " found and read.")
+            except:
+                print("Conference " + str(conferenceiteration) +
+                      " not read. Continuing.")
+        print("Conference " + str(conferencecounter + 1) +
+              " not read. Continuing.")
+
+    # check which homework data exists
+    # determine whether to create new groups or append existing conference
+    if students: # evaluates as false if students array is empty
+        homeworkcounter = max([0] + list(classfiles["homework"].keys()))
+        # most recent homework, by number
+        if (homeworkcounter == 0):
+            print("No homework found. Exiting.")
+            operation = "none"
         else:
-            identical_names[printable_name].append(studentid)
-    n_initials = 1
-    while (n_initials < firstname_char_limit):
-        n_initials = n_initials + 1
-        remove_names, add_names = [], {}
-        for printable_name in identical_names:
-            if (len(identical_names[printable_name]) != 1):
-                for studentid in identical_names[printable_name]:
-                    lastname, firstname = full_names[studentid]
-                    new_name = lastname[:lastname_char_limit] + ", " + firstname[:n_initials]
-                    if (len(firstname) > n_initials):
-                        new_name = new_name + "."
-                    if (new_name not in add_names):
-                        add_names[new_name] = [studentid]
-                    else:
-                        add_names[new_name].append(studentid)
-                remove_names.append(printable_name)
-        for add_name in add_names:
-            identical_names[add_name] = add_names[add_name]
-            # can't do this while looping through identical_names
-        for removable_name in remove_names:
-            del identical_names[removable_name]
-            # can't do this while looping through identical_names
-        if (len(remove_names) == 0):
-            break
-    for printable_name in identical_names:
-        studentid = identical_names[printable_name][0]
-        printable_names[studentid] = printable_name
-    with open(readablefile, "w") as readableobject:
-        for groupid in sorted(list(updated_questions.keys())):
-            if ((conferencecounter == 4) and # indexed from 0
-                (updated_questions[groupid] == 3)):
-                write_str = "(Group {:d} will choose Question 1 or 2.)".format(groupid).ljust(39, " ") + "\n"
+            print("Most recent homework found: " + str(homeworkcounter))
+            if (homeworkcounter == conferencecounter + 1):
+                operation = "create"
+                print("New groups will be generated for Conference " +
+                      str(homeworkcounter))
+            elif (homeworkcounter == conferencecounter):
+                operation = "update"
+                print("Existing groups will be updated for Conference " +
+                      str(homeworkcounter))
             else:
-                write_str = "(Group {:d} will present Question {:d}.)".format(groupid, updated_questions[groupid]).ljust(39, " ") + "\n"
-            readableobject.write(write_str)
-        for line in priorconferences:
+                operation = "none"
+                print("No action will be taken.")
+    else:
+        operation = "none"
+
+    # generate list of prior associations
+    if (operation != "none"):
+        conference = conferencecounter # being written, indexed from 0
+        if (operation == "update"):
+            conference = conferencecounter - 1 # the last one read
+        (associationsdict, questionsdict,
+         associationstable) = build_associations(history.studentids,
+                                                 history.groups()[:, :conference],
+                                                 history.questions()[:, :conference])
+        # one pass over the history before this conference; also the dense
+        # matrix for the mcmc
+        print("List of prior associations built.")
+
+    # create placeholder for new group if necessary
+    #   otherwise, read existing groups
+    # read homework
+    if (operation == "create"):
+        includeddict = {}
+        history.add_conference() # empty, index conference
+    if (operation == "update"):
+        includeddict = {}
+        for row in range(len(history.studentids)):
+            studentid = history.studentids[row]
+            groupid, questionid = history.cell(row, conference) # from 0
+            if (groupid != ""): # absent students are grouped anew
+                includeddict[studentid] = (groupid, questionid)
+    if (operation != "none"):
+        excludeddict = {}
+        for line in students: # lastname, firstname, id
             studentid = line[2]
-            groupid = line[3 + conferencecounter * 2]
-            if (groupid != ""):
-                write_str = "{:s} {:2d}\n".format(printable_names[studentid].ljust(36, "-"), groupid)
+            excludeddict[studentid] = ""
+        try:
+            homeworkfile = classfiles["homework"][homeworkcounter]
+            homework = cache.read(homeworkfile, read_homework)
+            for studentid, excludedmask in zip(homework["ids"].tolist(),
+                                               homework["excluded"].tolist()):
+                excludeddict[studentid] = excluded_string(excludedmask)
+            print("Homework " + str(homeworkcounter) + " found and read.")
+        except:
+            print("Error reading homework. Exiting.")
+            operation = "none"
+    try:
+        cache.save() # only if a file was parsed
+    except OSError:
+        print("History cache not written. Continuing.")
+
+    # update groups
+    if (operation != "none"):
+        (updated_assignments,
+         updated_questions) = updategroups(students, associationsdict,
+                                           includeddict, excludeddict,
+                                           questionsdict, associationstable,
+                                           tempering_depth=int(options.tempering_depth),
+                                           annealing_depth=int(options.annealing_depth),
+                                           temperatures=options.temperatures,
+                                           start=options.start,
+                                           parallel=options.parallel,
+                                           n_replicas=options.replicas,
+                                           adaptive_ladder=options.adaptive_ladder,
+                                           engine=options.engine,
+                                           adaptive_moves=options.adaptive_moves,
+                                           time_budget=options.time_budget,
+                                           stall_window=options.stall_window,
+                                           telemetry_path=options.telemetry,
+                                           headless=options.headless)
+        # assignments: key = student id, value = group number
+        # groups: key = group number, value = question number
+        final_penalty = mcmc_penalty(associationsdict, excludeddict,
+                                     questionsdict, updated_assignments,
+                                     updated_questions)
+        for row in range(len(history.studentids)):
+            studentid = history.studentids[row]
+            if (studentid in updated_assignments):
+                groupid = updated_assignments[studentid]
+                questionid = updated_questions[groupid]
+                if (studentid not in includeddict):
+                    history.set_cell(row, conference, groupid,
+                                     questionid) # indexed from 0
+        print("Groups updated.")
+        conferencefile = (rosterpath + "astr" + userclass + "_conf" +
+                          str(conference + 1) + ".csv")
+        with open(conferencefile, "w") as conferenceobject:
+            for row in range(len(history.studentids)):
+                groupid, questionid = history.cell(row, conference)
+                write_str = (history.lastnames[row] + ", " +
+                             history.firstnames[row] + ", " +
+                             str(history.studentids[row]) + ", " +
+                             str(groupid) + ", " + str(questionid) + "\n")
+                conferenceobject.write(write_str)
+        print("Machine-readable file written.")
+        readablefile = (rosterpath + "astr" + userclass + "_conf" +
+                        str(conference + 1) + "_readable.txt")
+        lastname_char_limit = 31
+        firstname_char_limit = 39 - 5 - lastname_char_limit
+        # 5 chars reserved for formatting
+        printable_names, identical_names, full_names = {}, {}, {}
+        # make sure printable names are unique
+        for row in range(len(history.studentids)):
+            lastname = history.lastnames[row]
+            firstname = history.firstnames[row]
+            studentid = history.studentids[row]
+            full_names[studentid] = (lastname, firstname)
+            printable_name = lastname[:lastname_char_limit] + ", " + firstname[0] + "."
+            if (printable_name not in identical_names):
+                identical_names[printable_name] = [studentid]
+            else:
+                identical_names[printable_name].append(studentid)
+        n_initials = 1
+        while (n_initials < firstname_char_limit):
+            n_initials = n_initials + 1
+            remove_names, add_names = [], {}
+            for printable_name in identical_names:
+                if (len(identical_names[printable_name]) != 1):
+                    for studentid in identical_names[printable_name]:
+                        lastname, firstname = full_names[studentid]
+                        new_name = lastname[:lastname_char_limit] + ", " + firstname[:n_initials]
+                        if (len(firstname) > n_initials):
+                            new_name = new_name + "."
+                        if (new_name not in add_names):
+                            add_names[new_name] = [studentid]
+                        else:
+                            add_names[new_name].append(studentid)
+                    remove_names.append(printable_name)
+            for add_name in add_names:
+                identical_names[add_name] = add_names[add_name]
+                # can't do this while looping through identical_names
+            for removable_name in remove_names:
+                del identical_names[removable_name]
+                # can't do this while looping through identical_names
+            if (len(remove_names) == 0):
+                break
+        for printable_name in identical_names:
+            studentid = identical_names[printable_name][0]
+            printable_names[studentid] = printable_name
+        with open(readablefile, "w") as readableobject:
+            for groupid in sorted(list(updated_questions.keys())):
+                if ((conference == 4) and # indexed from 0
+                    (updated_questions[groupid] == 3)):
+                    write_str = "(Group {:d} will choose Question 1 or 2.)".format(groupid).ljust(39, " ") + "\n"
+                else:
+                    write_str = "(Group {:d} will present Question {:d}.)".format(groupid, updated_questions[groupid]).ljust(39, " ") + "\n"
                 readableobject.write(write_str)
-    print("Human-readable file written.")
+            for row in range(len(history.studentids)):
+                studentid = history.studentids[row]
+                groupid = history.cell(row, conference)[0]
+                if (groupid != ""):
+                    write_str = "{:s} {:2d}\n".format(printable_names[studentid].ljust(36, "-"), groupid)
+                    readableobject.write(write_str)
+        print("Human-readable file written.")
+    if (operation == "none"):
+        return None # nothing written
+    return final_penalty
+
+if __name__ == "__main__":
+    sys.exit(main())
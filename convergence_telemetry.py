@@ -0,0 +1,94 @@
+# bounded-memory convergence telemetry for the mcmc
+#   instead of keeping every iteration's penalty, penalties are summarized
+#   per window of iterations as (first iteration, min, mean, max), and only
+#   the most recent summaries are kept, in a fixed-size ring buffer
+#   summaries can also be streamed to a JSONL file as they complete, so the
+#   full run is kept on disk while memory stays constant
+# usage:
+#   recorder = PenaltyRecorder(window=100, capacity=1000)
+#   recorder.record(penalty) # once per iteration
+#   iterations, mins, means, maxs = recorder.columns() # for plotting
+
+import json
+from collections import deque
+
+class PenaltyRecorder:
+    def __init__(self, window=100, capacity=1000, stream=None, label=None):
+        # window: iterations per summary
+        # capacity: summaries kept in memory (oldest are dropped)
+        # stream: optional open file, one JSON line written per summary
+        # label: written with each streamed summary, e.g. chain number
+        self.window = window
+        self.summaries = deque(maxlen=capacity)
+        self.stream = stream
+        self.label = label
+        self.n_iterations = 0 # iterations seen so far, including skipped
+        self.last = None # most recent penalty
+        self.window_start = 0
+        self.window_count = 0
+        self.window_min, self.window_max, self.window_sum = None, None, 0
+
+    # add one iteration's penalty
+    def record(self, penalty):
+        if (self.window_count == 0):
+            self.window_start = self.n_iterations
+            self.window_min, self.window_max, self.window_sum = (penalty,
+                                                                 penalty, 0)
+        elif (penalty < self.window_min):
+            self.window_min = penalty
+        elif (penalty > self.window_max):
+            self.window_max = penalty
+        self.window_sum = self.window_sum + penalty
+        self.window_count = self.window_count + 1
+        self.n_iterations = self.n_iterations + 1
+        self.last = penalty
+        if (self.window_count == self.window):
+            self.flush()
+
+    # add several iterations' penalties
+    def extend(self, penalties):
+        for penalty in penalties:
+            self.record(penalty)
+
+    # advance past iterations with no penalty (e.g. a chain stopped early)
+    def skip(self, n_iterations):
+        if (n_iterations <= 0):
+            return
+        self.flush()
+        self.n_iterations = self.n_iterations + n_iterations
+
+    # close the current (possibly partial) window
+    def flush(self):
+        if (self.window_count == 0):
+            return
+        summary = (self.window_start, self.window_min,
+                   self.window_sum / self.window_count, self.window_max)
+        self.summaries.append(summary)
+        if (self.stream is not None):
+            self.write_summary(summary, self.stream)
+        self.window_count = 0
+
+    # write one summary as a JSON line
+    def write_summary(self, summary, stream):
+        record = {"iteration": summary[0], "min": summary[1],
+                  "mean": summary[2], "max": summary[3]}
+        if (self.label is not None):
+            record["label"] = self.label
+        stream.write(json.dumps(record) + "\n")
+
+    # write all summaries kept in memory, e.g. for a run done in a worker
+    def dump(self, stream):
+        self.flush()
+        for summary in self.summaries:
+            self.write_summary(summary, stream)
+
+    # summaries kept in memory, as four lists for plotting
+    def columns(self):
+        self.flush()
+        iterations, mins, means, maxs = [], [], [], []
+        for summary in self.summaries:
+            iterations.append(summary[0])
+            mins.append(summary[1])
+            means.append(summary[2])
+            maxs.append(summary[3])
+        return (iterations, mins, means, maxs)
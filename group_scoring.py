@@ -0,0 +1,234 @@
+# incremental penalty bookkeeping for the mcmc group assignment
+#   gives the same penalty as mcmc_penalty (see conference_annealing_sp20.py
+#   and conference_tempering_sp22.py), but keeps group membership and
+#   per-group penalty contributions between proposals, so the change in
+#   penalty for moving one student only costs O(group size)
+# usage:
+#   pairtable = build_pair_table(studentids, priorassociations)
+#   questiontable = build_question_table(pairtable[0], excludehw, pastdict,
+#                                        questionids)
+#   state = GroupState(pairtable[0], ...) # see group_state.py
+#   scorer = GroupScorer(state, pairtable, questiontable)
+#   penalty_new = scorer.penalty + scorer.propose_move(student, group)
+#   penalty_new = scorer.penalty + scorer.propose_swap(group1, group2)
+#   penalty_new = scorer.penalty + scorer.propose_trade(student1, student2)
+#   scorer.accept() # otherwise do nothing; rejection is free
+#   students and groups are indices into the state, not raw ids
+
+import numpy # for dense penalty tables
+
+max_exponent = 19 # maximum penalty
+
+# penalty for a group not having 4 or 5 members
+def size_penalty(n_members):
+    if ((n_members < 4) or (n_members > 5)):
+        return 2 ** max_exponent
+    return 0
+
+# build dense, index-mapped co-occurrence matrix from prior associations
+#   returns (studentindex, pair_counts, pair_weights)
+#   studentindex: key = student id, value = row/column in the matrices
+#   pair_counts[i, j]: times student i has worked with student j
+#   pair_weights[i, j]: 2 ** (2 * count), or 0 if never together
+def build_pair_table(studentids, priorassociations):
+    studentindex = {}
+    for studentid in studentids:
+        if (studentid not in studentindex):
+            studentindex[studentid] = len(studentindex)
+    n_students = len(studentindex)
+    pair_counts = numpy.zeros((n_students, n_students), dtype=numpy.int16)
+    for studentid in studentindex:
+        row = studentindex[studentid]
+        for partnerid in priorassociations[studentid]:
+            if (partnerid in studentindex):
+                pair_counts[row, studentindex[partnerid]] += 1
+    return pair_table_from_counts(studentindex, pair_counts)
+
+# finish a pair table from a matrix of counts (see build_pair_table)
+#   pair_counts: int16 matrix, indexed as in studentindex
+def pair_table_from_counts(studentindex, pair_counts):
+    n_students = len(studentindex)
+    max_count = int(pair_counts.max()) if (n_students > 0) else 0
+    if (max_count > 31):
+        raise ValueError("Too many prior associations for one pair: " +
+                         str(max_count))
+    if (max_count <= 127):
+        pair_counts = pair_counts.astype(numpy.int8)
+    if (max_count <= 15): # 2 ** 30 still fits
+        weight_type = numpy.int32
+    else:
+        weight_type = numpy.int64
+    pair_weights = numpy.left_shift(1, 2 * pair_counts.astype(weight_type))
+    pair_weights[pair_counts == 0] = 0
+    return (studentindex, pair_counts, pair_weights)
+
+# build students x questions penalty table from history and homework
+#   question_costs[i, q]: 2 ** count for having worked on question q before
+#   (0 if never), plus 2 ** max_exponent if q was not completed in hw
+#   columns run from 0 (placeholder) to the largest question number seen
+def build_question_table(studentindex, excludehw, pastdict, questionids):
+    n_questions = max([3] + list(questionids)) + 1
+    for studentid in studentindex:
+        if pastdict[studentid]:
+            n_questions = max(n_questions, max(pastdict[studentid]) + 1)
+    question_costs = numpy.zeros((len(studentindex), n_questions),
+                                 dtype=numpy.int64)
+    for studentid in studentindex:
+        row = studentindex[studentid]
+        for questionid in range(n_questions):
+            question_exponent = pastdict[studentid].count(questionid)
+            if (question_exponent > 0):
+                question_costs[row, questionid] += 2 ** question_exponent
+            if (str(questionid) in excludehw[studentid]):
+                question_costs[row, questionid] += 2 ** max_exponent
+    return question_costs
+
+class GroupScorer:
+    def __init__(self, state, pairtable, questiontable):
+        # GroupState, changed in place by accept()
+        # tuple from build_pair_table
+        # table from build_question_table
+        self.state = state
+        self.pair_weights = pairtable[2]
+        self.question_costs = questiontable
+        self.members = [] # for each group index, set of student indices
+        for group in range(len(state.groupids)):
+            self.members.append(set())
+        for student in state.order:
+            self.members[state.assignment[student]].add(student)
+        self.group_penalties = [] # for each group index, penalty
+        for group in range(len(state.groupids)):
+            self.group_penalties.append(self.score_group(group))
+        self.penalty = sum(self.group_penalties)
+        self.pending = None # last proposal, applied by accept()
+
+    # full penalty contributed by one group, from scratch
+    #   pair penalties for having worked together in previous group
+    #   question penalties for previous questions and incomplete hw
+    def score_group(self, group):
+        pair_weights, question_costs = self.pair_weights, self.question_costs
+        members = self.members[group]
+        questionid = self.state.question[group]
+        penalty = size_penalty(len(members))
+        for student in members:
+            for partner in members:
+                penalty = penalty + int(pair_weights[student, partner])
+            penalty = penalty + int(question_costs[student, questionid])
+        return penalty
+
+    # sum of pair penalties (both directions) between a student and a group
+    def pair_sum(self, student, group):
+        pair_weights = self.pair_weights
+        penalty = 0
+        for partner in self.members[group]:
+            penalty = (penalty + int(pair_weights[student, partner]) +
+                       int(pair_weights[partner, student]))
+        return penalty
+
+    # sum of question penalties for a group's members on a given question
+    def question_sum(self, group, questionid):
+        question_costs = self.question_costs
+        penalty = 0
+        for student in self.members[group]:
+            penalty = penalty + int(question_costs[student, questionid])
+        return penalty
+
+    # change in penalty for moving one student to another group
+    #   nothing is changed until accept() is called
+    def propose_move(self, student, group2):
+        state = self.state
+        group1 = state.assignment[student]
+        if (group1 == group2):
+            self.pending = None
+            return 0
+        self_penalty = int(self.pair_weights[student, student])
+        n_members1 = len(self.members[group1])
+        n_members2 = len(self.members[group2])
+        delta1 = (self_penalty - self.pair_sum(student, group1) -
+                  int(self.question_costs[student, state.question[group1]]) +
+                  size_penalty(n_members1 - 1) - size_penalty(n_members1))
+        delta2 = (self_penalty + self.pair_sum(student, group2) +
+                  int(self.question_costs[student, state.question[group2]]) +
+                  size_penalty(n_members2 + 1) - size_penalty(n_members2))
+        self.pending = ("move", student, group1, group2, delta1, delta2)
+        return delta1 + delta2
+
+    # change in penalty for swapping two groups' questions
+    #   only the question terms of the two groups' members change
+    #   nothing is changed until accept() is called
+    def propose_swap(self, group1, group2):
+        question1 = self.state.question[group1]
+        question2 = self.state.question[group2]
+        if (question1 == question2):
+            self.pending = None
+            return 0
+        delta1 = (self.question_sum(group1, question2) -
+                  self.question_sum(group1, question1))
+        delta2 = (self.question_sum(group2, question1) -
+                  self.question_sum(group2, question2))
+        self.pending = ("swap", None, group1, group2, delta1, delta2)
+        return delta1 + delta2
+
+    # change in penalty for swapping two students between their groups
+    #   group sizes are unchanged, so there is no size term
+    #   nothing is changed until accept() is called
+    def propose_trade(self, student1, student2):
+        state = self.state
+        group1 = state.assignment[student1]
+        group2 = state.assignment[student2]
+        if (group1 == group2):
+            self.pending = None
+            return 0
+        pair_weights, question_costs = self.pair_weights, self.question_costs
+        self_penalty1 = int(pair_weights[student1, student1])
+        self_penalty2 = int(pair_weights[student2, student2])
+        cross_penalty = (int(pair_weights[student1, student2]) +
+                         int(pair_weights[student2, student1]))
+        # pair_sum of the incoming student counts the outgoing one too
+        question1, question2 = state.question[group1], state.question[group2]
+        delta1 = (self_penalty1 - self.pair_sum(student1, group1) -
+                  int(question_costs[student1, question1]) +
+                  self_penalty2 + self.pair_sum(student2, group1) -
+                  cross_penalty + int(question_costs[student2, question1]))
+        delta2 = (self_penalty2 - self.pair_sum(student2, group2) -
+                  int(question_costs[student2, question2]) +
+                  self_penalty1 + self.pair_sum(student1, group2) -
+                  cross_penalty + int(question_costs[student1, question2]))
+        self.pending = ("trade", (student1, student2), group1, group2,
+                        delta1, delta2)
+        return delta1 + delta2
+
+    # apply the last proposal
+    def accept(self):
+        if (self.pending is None):
+            return
+        move, student, group1, group2, delta1, delta2 = self.pending
+        state = self.state
+        if (move == "move"):
+            self.members[group1].remove(student)
+            self.members[group2].add(student)
+            state.assignment[student] = group2
+        elif (move == "trade"):
+            student1, student2 = student
+            self.members[group1].remove(student1)
+            self.members[group2].remove(student2)
+            self.members[group1].add(student2)
+            self.members[group2].add(student1)
+            state.assignment[student1] = group2
+            state.assignment[student2] = group1
+        else: # move == "swap"
+            (state.question[group1],
+             state.question[group2]) = state.question[group2], state.question[group1]
+        self.group_penalties[group1] = self.group_penalties[group1] + delta1
+        self.group_penalties[group2] = self.group_penalties[group2] + delta2
+        self.penalty = self.penalty + delta1 + delta2
+        self.pending = None
+
+    # assign a question to a group, rescoring only that group's members
+    def set_question(self, group, questionid):
+        delta = (self.question_sum(group, questionid) -
+                 self.question_sum(group, self.state.question[group]))
+        self.state.question[group] = questionid
+        self.group_penalties[group] = self.group_penalties[group] + delta
+        self.penalty = self.penalty + delta
+        self.pending = None
@@ -0,0 +1,73 @@
+# compact solver state for the mcmc group assignment
+#   student ids and group ids are mapped to dense indices, and the state is
+#   held in int arrays instead of dictionaries keyed by raw ids
+#   protected students and groups are masked out of the open index lists
+#   instead of being merged back in on every proposal
+# usage:
+#   state = GroupState(studentindex, protected_assignments, open_assignments,
+#                      protected_groups, open_groups)
+#   (return_assignments, return_groups) = state.to_dicts() # only at the end
+#   snapshot = state.copy() # cheap, for keeping the best state
+
+from array import array
+from copy import copy
+
+class GroupState:
+    def __init__(self, studentindex, protected_assignments, open_assignments,
+                 protected_groups, open_groups):
+        # dictionary of student indices (rows of the penalty tables)
+        #   key = student id, value = index
+        # dictionaries of assignments (protected and open)
+        #   key = student id, value = group number
+        # dictionaries of groups (protected and open)
+        #   key = group number, value = question number
+        self.studentids = [None] * len(studentindex) # index -> student id
+        for studentid in studentindex:
+            self.studentids[studentindex[studentid]] = studentid
+        self.groupids = (list(protected_groups.keys()) +
+                         list(open_groups.keys())) # index -> group number
+        groupindex = {}
+        for groupid in self.groupids:
+            groupindex[groupid] = len(groupindex)
+        self.assignment = array("i", [-1] * len(studentindex))
+        # group index of each student, -1 if not being grouped
+        self.question = array("i", [0] * len(self.groupids))
+        # question number of each group
+        for groupid in protected_groups:
+            self.question[groupindex[groupid]] = protected_groups[groupid]
+        for groupid in open_groups:
+            self.question[groupindex[groupid]] = open_groups[groupid]
+        self.order = array("i") # grouped students, protected first
+        self.open_students = array("i") # students the mcmc may move
+        self.open_groups = array("i", range(len(protected_groups),
+                                            len(self.groupids)))
+        # groups whose questions the mcmc may swap
+        for studentid in protected_assignments:
+            index = studentindex[studentid]
+            self.assignment[index] = groupindex[protected_assignments[studentid]]
+            self.order.append(index)
+        for studentid in open_assignments:
+            index = studentindex[studentid]
+            self.assignment[index] = groupindex[open_assignments[studentid]]
+            self.order.append(index)
+            self.open_students.append(index)
+
+    # copy of this state, e.g. to keep the best one seen
+    #   only assignment and question change during the mcmc, so the index
+    #   lists are shared and the copy is two array copies
+    def copy(self):
+        state = copy(self)
+        state.assignment = self.assignment[:]
+        state.question = self.question[:]
+        return state
+
+    # convert back to dictionaries
+    #   assignments: key = student id, value = group number
+    #   groups: key = group number, value = question number
+    def to_dicts(self):
+        return_assignments, return_groups = {}, {}
+        for index in self.order:
+            return_assignments[self.studentids[index]] = self.groupids[self.assignment[index]]
+        for groupindex in range(len(self.groupids)):
+            return_groups[self.groupids[groupindex]] = self.question[groupindex]
+        return (return_assignments, return_groups)
@@ -0,0 +1,87 @@
+# cache of parsed roster, conference and homework files
+#   late in the semester every run re-reads and re-parses the roster, each
+#   prior conference and the homework; the parsed columns of each file are
+#   kept in one compact .npz file next to the roster instead
+#   each file's entry is keyed by its path, size and modification time, so
+#   a file that changed is parsed again and a new file (e.g. the next
+#   conference or homework) is parsed and added on its own; files not read
+#   in a run are dropped from the cache when it is saved
+# usage:
+#   cache = HistoryCache(rosterpath + "astr" + userclass + "_history.npz")
+#   columns = cache.read(rosterfile, parse) # parse(path) -> dict of arrays
+#   cache.save() # only written if something was parsed
+#   HistoryCache(None) parses every time and never writes
+
+import os
+import numpy
+
+cache_version = 2 # changed whenever the parsed columns change
+
+class HistoryCache:
+    def __init__(self, cachefile):
+        self.cachefile = cachefile
+        self.entries = {} # key = path, value = (size, mtime, dict of arrays)
+        self.used = set() # paths read in this run
+        self.changed = False
+        if ((cachefile is not None) and os.path.exists(cachefile)):
+            try:
+                self.load()
+            except Exception:
+                # unreadable cache (empty, truncated, not an npz file, ...)
+                #   start over; every file is parsed and the cache rewritten
+                self.entries = {}
+
+    def load(self):
+        with numpy.load(self.cachefile, allow_pickle=False) as data:
+            if (int(data["version"]) != cache_version):
+                return # parsed by an older version, start over
+            paths = data["paths"]
+            sizes, mtimes = data["sizes"], data["mtimes"]
+            columns = [{} for path in paths]
+            for name in data.files:
+                if ("/" in name): # "index/column"
+                    index, column = name.split("/", 1)
+                    columns[int(index)][column] = data[name]
+            for index in range(len(paths)):
+                self.entries[str(paths[index])] = (int(sizes[index]),
+                                                   int(mtimes[index]),
+                                                   columns[index])
+
+    # parsed columns of one file, from the cache if it is unchanged
+    #   raises OSError if the file does not exist, like open()
+    def read(self, path, parse):
+        status = os.stat(path)
+        self.used.add(path)
+        if (path in self.entries):
+            size, mtime, columns = self.entries[path]
+            if ((size == status.st_size) and (mtime == status.st_mtime_ns)):
+                return columns
+        columns = parse(path)
+        self.entries[path] = (status.st_size, status.st_mtime_ns, columns)
+        self.changed = True
+        return columns
+
+    # write the entries of the files read in this run, if any were parsed
+    #   written to a temporary file first, so a reader never sees half
+    def save(self):
+        if ((self.cachefile is None) or
+            ((not self.changed) and (self.used == set(self.entries)))):
+            return False
+        paths = sorted(self.used)
+        arrays = {"version": numpy.array(cache_version),
+                  "paths": numpy.array(paths, dtype=str),
+                  "sizes": numpy.array([self.entries[path][0]
+                                        for path in paths], dtype=numpy.int64),
+                  "mtimes": numpy.array([self.entries[path][1]
+                                         for path in paths],
+                                        dtype=numpy.int64)}
+        for index in range(len(paths)):
+            columns = self.entries[paths[index]][2]
+            for column in columns:
+                arrays["{:d}/{:s}".format(index, column)] = columns[column]
+        temporaryfile = self.cachefile + ".tmp"
+        with open(temporaryfile, "wb") as cacheobject:
+            numpy.savez(cacheobject, **arrays)
+        os.replace(temporaryfile, self.cachefile)
+        self.changed = False
+        return True
@@ -0,0 +1,97 @@
+# starting assignment for the mcmc
+#   instead of putting each open student in a random group (which nearly
+#   always leaves groups outside 4 to 5 members), seats are first dealt
+#   round-robin so that every group is filled to a balanced size, then the
+#   open students are placed one at a time, in random order, into the open
+#   seat where they add the least penalty (prior partners already placed
+#   there, and the group's question against their question history)
+#   protected students and all questions are left as they are
+# usage:
+#   initialize_state(state, pairtable, questiontable, "greedy")
+#   start: "random" (leave state as is), "balanced" or "greedy"
+
+import heapq
+import random
+import numpy
+
+# default annealing temperature to start cooling from, by start
+#   a random start needs to be hot (1e6) to get past the 2 ** 19 size and
+#   homework penalties; a balanced or greedy start already avoids most of
+#   them, so it starts on the scale of one prior pairing (2 ** 2) and the
+#   start is refined instead of scrambled
+start_temperatures = {"random": 1.0e+6, "balanced": 2.0 ** 2,
+                      "greedy": 2.0 ** 2}
+
+# number of open seats in each group, dealt round-robin to the smallest
+#   returns list indexed by group index
+def balanced_seats(state):
+    n_groups = len(state.groupids)
+    open_students = set(state.open_students)
+    sizes = [0] * n_groups
+    for student in state.order:
+        if (student not in open_students):
+            sizes[state.assignment[student]] += 1
+    seats = [0] * n_groups
+    group_order = list(range(n_groups))
+    random.shuffle(group_order) # which groups get the extra seats
+    heap = [(sizes[group], position, group)
+            for position, group in enumerate(group_order)]
+    heapq.heapify(heap)
+    for n_seat in range(len(state.open_students)):
+        size, position, group = heapq.heappop(heap)
+        seats[group] = seats[group] + 1
+        heapq.heappush(heap, (size + 1, position, group))
+    return seats
+
+# fill the dealt seats with open students in random order
+def balanced_start(state):
+    seats = balanced_seats(state)
+    students = list(state.open_students)
+    random.shuffle(students)
+    for group in range(len(seats)):
+        for n_seat in range(seats[group]):
+            state.assignment[students.pop()] = group
+
+# place open students one at a time into their cheapest open seat
+#   cost of a seat = pair penalties with students already in the group
+#   (both directions) + question penalty for the group's question
+def greedy_start(state, pairtable, questiontable):
+    seats = numpy.array(balanced_seats(state), dtype=numpy.int64)
+    pair_weights = pairtable[2]
+    questions = numpy.array(state.question, dtype=numpy.int64)
+    open_students = list(state.open_students)
+    open_set = set(open_students)
+    placed_students = numpy.zeros(len(state.order), dtype=numpy.int64)
+    placed_groups = numpy.zeros(len(state.order), dtype=numpy.int64)
+    n_placed = 0
+    for student in state.order:
+        if (student not in open_set):
+            placed_students[n_placed] = student
+            placed_groups[n_placed] = state.assignment[student]
+            n_placed = n_placed + 1
+    group_order = numpy.arange(len(seats))
+    random.shuffle(open_students)
+    random.shuffle(group_order) # break ties in a different order each run
+    for student in open_students:
+        costs = questiontable[student, questions].astype(float)
+        if (n_placed > 0):
+            partners = placed_students[:n_placed]
+            costs = costs + numpy.bincount(placed_groups[:n_placed],
+                                           weights=(pair_weights[student, partners] +
+                                                    pair_weights[partners, student]),
+                                           minlength=len(seats))
+        costs = numpy.where(seats > 0, costs, numpy.inf)[group_order]
+        group = int(group_order[numpy.argmin(costs)])
+        seats[group] = seats[group] - 1
+        state.assignment[student] = group
+        placed_students[n_placed] = student
+        placed_groups[n_placed] = group
+        n_placed = n_placed + 1
+
+# replace the open students' groups in state, according to start
+def initialize_state(state, pairtable, questiontable, start):
+    if (start == "balanced"):
+        balanced_start(state)
+    elif (start == "greedy"):
+        greedy_start(state, pairtable, questiontable)
+    return state
@@ -0,0 +1,86 @@
+# adaptive choice between mcmc move types
+#   "swap": swap two open groups' questions
+#   "move": move one open student to another group
+#   "trade": swap two open students between their groups (sizes unchanged)
+#   each move type is chosen in proportion to how useful it has recently
+#   been: how often it was accepted with a change in penalty, plus its share
+#   of the recent decrease in penalty per proposal (so the moves that can
+#   repair group sizes win out while sizes are wrong)
+#   counts decay at every retune, so the probabilities follow the run as it
+#   cools; no move type drops below a floor probability
+# usage:
+#   selector = MoveSelector()
+#   move = selector.choose(can_swap, can_trade)
+#   selector.update(move, accepted, delta)
+
+import random
+
+class MoveSelector:
+    def __init__(self, probabilities=None, interval=500, decay=0.5,
+                 floor=0.05):
+        # probabilities: starting probability of each move type
+        # interval: proposals between retunes
+        # decay: factor applied to all counts at each retune
+        # floor: minimum probability of each move type
+        if (probabilities is None):
+            probabilities = {"swap": 0.2, "move": 0.4, "trade": 0.4}
+        self.moves = list(probabilities.keys())
+        self.probabilities = dict(probabilities)
+        self.interval = interval
+        self.decay = decay
+        self.floor = floor
+        self.proposed, self.accepted, self.improved = {}, {}, {}
+        for move in self.moves:
+            self.proposed[move] = 0.0
+            self.accepted[move] = 0.0 # accepted with a change in penalty
+            self.improved[move] = 0.0 # total decrease in penalty
+        self.n_proposals = 0
+
+    # draw a move type
+    #   can_swap: at least two open groups; can_trade: two open students
+    #   a move type that is not possible falls back to "move"
+    def choose(self, can_swap=True, can_trade=True):
+        threshold = random.random()
+        cumulative = 0.0
+        move = self.moves[-1]
+        for candidate in self.moves:
+            cumulative = cumulative + self.probabilities[candidate]
+            if (threshold < cumulative):
+                move = candidate
+                break
+        if (((move == "swap") and (not can_swap)) or
+            ((move == "trade") and (not can_trade))):
+            move = "move"
+        return move
+
+    # record the outcome of one proposal
+    def update(self, move, accepted, delta):
+        self.proposed[move] = self.proposed[move] + 1
+        if (accepted and (delta != 0)):
+            self.accepted[move] = self.accepted[move] + 1
+            if (delta < 0):
+                self.improved[move] = self.improved[move] - delta
+        self.n_proposals = self.n_proposals + 1
+        if (self.n_proposals % self.interval == 0):
+            self.retune()
+
+    # set probabilities from the useful acceptance rates, then decay counts
+    def retune(self):
+        scores, gains = {}, {}
+        for move in self.moves:
+            scores[move] = ((self.accepted[move] + 1.0) /
+                            (self.proposed[move] + 1.0))
+            # +1 so untried or unlucky moves keep some weight
+            gains[move] = self.improved[move] / (self.proposed[move] + 1.0)
+        total_gain = sum(gains.values())
+        if (total_gain > 0):
+            for move in self.moves:
+                scores[move] = scores[move] + gains[move] / total_gain
+        total = sum(scores.values())
+        spread = 1.0 - self.floor * len(self.moves)
+        for move in self.moves:
+            self.probabilities[move] = (self.floor +
+                                        spread * scores[move] / total)
+            self.proposed[move] = self.proposed[move] * self.decay
+            self.accepted[move] = self.accepted[move] * self.decay
+            self.improved[move] = self.improved[move] * self.decay
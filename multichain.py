@@ -0,0 +1,292 @@
+# lockstep multi-chain mcmc engine
+#   advances K independent chains together with numpy: each step draws one
+#   proposal per chain, scores all of them with vectorized gathers from the
+#   penalty tables (see group_scoring.py) over the members of the groups
+#   involved, and accepts or rejects them with one vectorized metropolis test
+#   same moves and penalty as anneal() / updategroups:
+#     with probability 0.2 (and at least two open groups), swap two open
+#     groups' questions; otherwise move one open student to a random group
+# usage:
+#   chains = MultiChain(states, pairtable, questiontable)
+#   energies = chains.anneal(temperatures, depth, recorders=recorders)
+#   states = chains.write_states() # back into the GroupState objects
+
+import random
+import time
+import numpy
+from group_scoring import GroupScorer, max_exponent
+
+stall_temperature = 2 ** max_exponent / 10
+# a stall_window only counts steps below this temperature: above it even
+# a size or homework violation is accepted often, so a new lowest penalty
+# is rare however long the chains run
+
+# penalty for groups not having 4 or 5 members, indexed by group size
+def size_penalty_table(max_members):
+    n_members = numpy.arange(max_members + 2)
+    return numpy.where((n_members < 4) | (n_members > 5),
+                       2 ** max_exponent, 0).astype(numpy.int64)
+
+class MultiChain:
+    def __init__(self, states, pairtable, questiontable, seed=None):
+        # list of GroupState, one per chain
+        #   all share the same students, groups and protected entries
+        # tuple from build_pair_table
+        # table from build_question_table
+        # seed for the numpy generator (drawn from random if not given)
+        if (seed is None):
+            seed = random.getrandbits(64)
+        self.rng = numpy.random.default_rng(seed)
+        self.states = states
+        state = states[0]
+        self.students = numpy.array(state.order, dtype=numpy.int64)
+        # table rows of the students being grouped; columns below
+        column = {}
+        for index in range(len(self.students)):
+            column[int(self.students[index])] = index
+        self.open_students = numpy.array([column[student] for student in
+                                          state.open_students],
+                                         dtype=numpy.int64)
+        self.open_groups = numpy.array(state.open_groups, dtype=numpy.int64)
+        self.n_groups = len(state.groupids)
+        self.size_penalties = size_penalty_table(len(self.students))
+        n_students = len(self.students)
+        self.sentinel = n_students # padding in the member lists
+        # tables get one extra all-zero row (and column) for the sentinel,
+        # so padded member slots add nothing
+        pair_weights = pairtable[2][numpy.ix_(self.students, self.students)]
+        pair_weights = pair_weights.astype(numpy.int64)
+        self.pair_sums = numpy.zeros((n_students + 1, n_students + 1),
+                                     dtype=numpy.int64)
+        self.pair_sums[:n_students, :n_students] = pair_weights + pair_weights.T
+        # both directions
+        self.self_pairs = 2 * numpy.diagonal(pair_weights).copy()
+        self.question_costs = numpy.zeros((n_students + 1,
+                                           questiontable.shape[1]),
+                                          dtype=numpy.int64)
+        self.question_costs[:n_students] = questiontable[self.students]
+        n_chains = len(states)
+        self.assignment = numpy.zeros((n_chains, n_students),
+                                      dtype=numpy.int64)
+        self.question = numpy.zeros((n_chains, self.n_groups),
+                                    dtype=numpy.int64)
+        self.sizes = numpy.zeros((n_chains, self.n_groups), dtype=numpy.int64)
+        self.energies = numpy.zeros(n_chains, dtype=numpy.int64)
+        self.best_chain = None # chain that last improved a BestState
+        for chain in range(n_chains):
+            self.assignment[chain] = [states[chain].assignment[student]
+                                      for student in self.students]
+            self.question[chain] = states[chain].question
+            self.sizes[chain] = numpy.bincount(self.assignment[chain],
+                                               minlength=self.n_groups)
+            self.energies[chain] = GroupScorer(states[chain], pairtable,
+                                               questiontable).penalty
+        # members[chain, group, :size]: columns of the group's members, then
+        # sentinels; slots[chain, column]: position in its member list
+        #   deltas gather only the two groups involved, so a step costs
+        #   O(chains x group size) instead of O(chains x students)
+        #   the lists grow (rarely; such groups are penalized) when full
+        capacity = max(8, int(self.sizes.max(initial=0)) + 2)
+        self.members = numpy.full((n_chains, self.n_groups, capacity),
+                                  self.sentinel, dtype=numpy.int64)
+        self.slots = numpy.zeros((n_chains, n_students), dtype=numpy.int64)
+        for chain in range(n_chains):
+            filled = [0] * self.n_groups
+            for column in range(n_students):
+                group = int(self.assignment[chain, column])
+                self.members[chain, group, filled[group]] = column
+                self.slots[chain, column] = filled[group]
+                filled[group] = filled[group] + 1
+
+    # change in penalty for moving one student per chain
+    def move_deltas(self, chains, students, groups2):
+        groups1 = self.assignment[chains, students]
+        members1 = self.members[chains, groups1]
+        members2 = self.members[chains, groups2]
+        pair_sums = self.pair_sums
+        delta = (pair_sums[students[:, None], members2].sum(axis=1) -
+                 pair_sums[students[:, None], members1].sum(axis=1) +
+                 self.self_pairs[students])
+        delta = (delta +
+                 self.question_costs[students,
+                                     self.question[chains, groups2]] -
+                 self.question_costs[students,
+                                     self.question[chains, groups1]])
+        size_penalties = self.size_penalties
+        sizes1 = self.sizes[chains, groups1]
+        sizes2 = self.sizes[chains, groups2]
+        delta = (delta +
+                 size_penalties[sizes1 - 1] - size_penalties[sizes1] +
+                 size_penalties[sizes2 + 1] - size_penalties[sizes2])
+        return numpy.where(groups1 == groups2, 0, delta)
+
+    # change in penalty for swapping two groups' questions per chain
+    def swap_deltas(self, chains, groups1, groups2):
+        questions1 = self.question[chains, groups1][:, None]
+        questions2 = self.question[chains, groups2][:, None]
+        members1 = self.members[chains, groups1]
+        members2 = self.members[chains, groups2]
+        question_costs = self.question_costs
+        return ((question_costs[members1, questions2] -
+                 question_costs[members1, questions1]).sum(axis=1) -
+                (question_costs[members2, questions2] -
+                 question_costs[members2, questions1]).sum(axis=1))
+
+    # move one student per chain (at most one move per chain)
+    def apply_moves(self, chains, students, groups2):
+        groups1 = self.assignment[chains, students]
+        # take the student out: the group's last member fills its slot
+        slots = self.slots[chains, students]
+        lasts = self.sizes[chains, groups1] - 1
+        moved = self.members[chains, groups1, lasts]
+        self.members[chains, groups1, slots] = moved
+        self.slots[chains, moved] = slots
+        self.members[chains, groups1, lasts] = self.sentinel
+        self.sizes[chains, groups1] -= 1
+        # and append it to its new group
+        slots = self.sizes[chains, groups2]
+        if ((len(slots) > 0) and (slots.max() >= self.members.shape[2])):
+            padding = numpy.full(self.members.shape, self.sentinel,
+                                 dtype=numpy.int64)
+            self.members = numpy.concatenate((self.members, padding), axis=2)
+        self.members[chains, groups2, slots] = students
+        self.slots[chains, students] = slots
+        self.sizes[chains, groups2] += 1
+        self.assignment[chains, students] = groups2
+
+    # swap two groups' questions per chain
+    def apply_swaps(self, chains, groups1, groups2):
+        questions1 = self.question[chains, groups1]
+        self.question[chains, groups1] = self.question[chains, groups2]
+        self.question[chains, groups2] = questions1
+
+    # run all chains for depth steps
+    #   temperatures: one per chain
+    #   cooling: scale temperatures down linearly to 0, as in updategroups
+    #   stops early once any chain reaches lower_bound (see presolve.py)
+    #   deadline: optional time.monotonic() time to stop by; when cooling,
+    #   temperatures follow the steps or the time used, whichever is further
+    #   stall_window: optional, stop after this many steps without a new
+    #   lowest penalty in any chain, counted once every chain is below
+    #   stall_temperature
+    #   recorders: optional PenaltyRecorder per chain (convergence_telemetry)
+    #   best: optional BestState (best_state.py); keeps a copy of the lowest
+    #   penalty chain state, and the run stops once best.stop_requested is set
+    #   returns list of energies
+    def anneal(self, temperatures, depth, cooling=False, recorders=None,
+               lower_bound=0, deadline=None, stall_window=None, best=None):
+        rng = self.rng
+        n_chains = len(self.energies)
+        chains = numpy.arange(n_chains)
+        temperatures = numpy.asarray(temperatures, dtype=float)
+        n_open_students = len(self.open_students)
+        n_open_groups = len(self.open_groups)
+        depth = int(depth)
+        if (recorders is not None):
+            for chain in range(n_chains):
+                recorders[chain].record(int(self.energies[chain]))
+        start_time, time_fraction = time.monotonic(), 0.0
+        energy_lowest, n_lowest = self.energies.min(), 0
+        if (best is not None):
+            self.improve_best(best)
+        for n_iteration in range(depth):
+            if (self.energies.min() <= lower_bound):
+                break # no better solution can be found
+            if ((best is not None) and best.stop_requested):
+                break # interrupted; best holds the answer so far
+            if ((deadline is not None) and (n_iteration % 100 == 0)):
+                time_now = time.monotonic()
+                if (time_now >= deadline):
+                    break # out of time
+                time_fraction = ((time_now - start_time) /
+                                 (deadline - start_time))
+            if (cooling):
+                step_temperatures = (temperatures * (depth - n_iteration) /
+                                     depth)
+                if (deadline is not None):
+                    step_temperatures = numpy.minimum(step_temperatures,
+                                                      temperatures *
+                                                      (1.0 - time_fraction))
+            else:
+                step_temperatures = temperatures
+            uniforms = rng.random((4, n_chains)) # all draws for this step
+            is_swap = uniforms[0] > 0.8
+            if (n_open_groups < 2):
+                is_swap[:] = False
+            deltas = numpy.zeros(n_chains, dtype=numpy.int64)
+            # swap two groups' questions
+            swap_chains = chains[is_swap]
+            if (len(swap_chains) > 0):
+                index1 = (uniforms[1, swap_chains] *
+                          n_open_groups).astype(numpy.int64)
+                index2 = (uniforms[2, swap_chains] *
+                          (n_open_groups - 1)).astype(numpy.int64)
+                index2 = index2 + (index2 >= index1) # two different groups
+                swap_groups1 = self.open_groups[index1]
+                swap_groups2 = self.open_groups[index2]
+                deltas[swap_chains] = self.swap_deltas(swap_chains,
+                                                       swap_groups1,
+                                                       swap_groups2)
+            # swap one student's groups
+            move_chains = chains[~is_swap]
+            if ((len(move_chains) > 0) and (n_open_students > 0)):
+                move_students = self.open_students[
+                    (uniforms[1, move_chains] *
+                     n_open_students).astype(numpy.int64)]
+                move_groups2 = (uniforms[2, move_chains] *
+                                self.n_groups).astype(numpy.int64)
+                deltas[move_chains] = self.move_deltas(move_chains,
+                                                       move_students,
+                                                       move_groups2)
+            # one metropolis test for all chains
+            thresholds = numpy.exp(numpy.minimum(0.0, -deltas /
+                                                 step_temperatures))
+            accepted = uniforms[3] < thresholds
+            self.energies = self.energies + numpy.where(accepted, deltas, 0)
+            if (len(swap_chains) > 0):
+                keep = accepted[swap_chains]
+                self.apply_swaps(swap_chains[keep], swap_groups1[keep],
+                                 swap_groups2[keep])
+            if ((len(move_chains) > 0) and (n_open_students > 0)):
+                keep = accepted[move_chains]
+                self.apply_moves(move_chains[keep], move_students[keep],
+                                 move_groups2[keep])
+            if (recorders is not None):
+                energies = self.energies.tolist()
+                for chain in range(n_chains):
+                    recorders[chain].record(energies[chain])
+            if (self.energies.min() < energy_lowest):
+                energy_lowest, n_lowest = self.energies.min(), n_iteration
+                if (best is not None):
+                    self.improve_best(best)
+            elif (step_temperatures.max() >= stall_temperature):
+                n_lowest = n_iteration # still hot; the stall window waits
+            elif ((stall_window is not None) and
+                  (n_iteration - n_lowest >= stall_window)):
+                break # no improvement in stall_window steps
+        return [int(energy) for energy in self.energies]
+
+    # offer the lowest penalty chain to a BestState
+    #   best_chain: the chain whose state it last kept
+    def improve_best(self, best):
+        chain = int(self.energies.argmin())
+        improved = best.improve(int(self.energies[chain]),
+                                lambda: self.write_state(chain,
+                                                         self.states[chain].copy()))
+        if (improved):
+            self.best_chain = chain
+        return improved
+
+    # copy one chain's assignment and questions into a GroupState
+    def write_state(self, chain, state):
+        for index in range(len(self.students)):
+            state.assignment[int(self.students[index])] = int(self.assignment[chain, index])
+        for group in range(self.n_groups):
+            state.question[group] = int(self.question[chain, group])
+        return state
+
+    # copy chain states back into their GroupState objects
+    def write_states(self):
+        for chain in range(len(self.states)):
+            self.write_state(chain, self.states[chain])
+        return self.states
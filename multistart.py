@@ -0,0 +1,154 @@
+# best-of-N independent runs across worker processes
+#   each run gets its own seed; as soon as any run reaches the target, every
+#   other run is told to stop through a shared event (target 0 by default)
+#   workers are forked (see replica_pool.py), so run_once and everything it
+#   refers to are inherited instead of pickled
+# usage:
+#   results = run_multistart(run_once, seeds, n_processes)
+#   run_once(cancel) returns a tuple whose first item is the penalty;
+#   it should check cancel.is_set() now and then and stop early if set,
+#   and can set cancel itself to stop the remaining runs
+#   target: lowest possible penalty; reaching it cancels the other runs
+#   if run_once raises in a worker, or a worker dies, the other runs are
+#   cancelled and run_multistart raises WorkerError
+#   best: optional BestState that run_once improves; workers send their new
+#   best states back as they find them, so the parent's copy stays current,
+#   and setting best.stop_requested in the parent cancels the runs
+
+import multiprocessing
+import queue as queue_module
+import random
+import time
+import traceback
+from replica_pool import fork_available
+
+# a run failed in a worker process
+#   the message holds the worker's traceback
+class WorkerError(RuntimeError):
+    pass
+
+# a new best state found in a worker process
+class Improvement:
+    def __init__(self, penalty, state):
+        self.penalty = penalty
+        self.state = state
+
+# sends a worker's new best states to the parent
+#   at most one every interval seconds while a run goes on; flush() sends
+#   the last one held back
+class ImprovementStream:
+    def __init__(self, best, results, interval=0.1):
+        self.results = results
+        self.interval = interval
+        self.sent_time = 0.0
+        self.pending = None # Improvement not sent yet
+        best.listener = self.send
+
+    def send(self, penalty, state):
+        self.pending = Improvement(penalty, state)
+        if (time.monotonic() - self.sent_time >= self.interval):
+            self.flush()
+
+    def flush(self):
+        if (self.pending is not None):
+            self.results.put(self.pending)
+            self.sent_time = time.monotonic()
+            self.pending = None
+
+# worker loop: run each assigned seed until done or cancelled
+#   a failure is sent back as a WorkerError; the None that marks this
+#   worker as done is always sent
+def multistart_worker(run_once, seeds, cancel, results, target=0, best=None):
+    stream = None
+    if (best is not None):
+        stream = ImprovementStream(best, results)
+    try:
+        for seed in seeds:
+            if cancel.is_set():
+                break
+            random.seed(seed)
+            result = run_once(cancel)
+            if (stream is not None):
+                stream.flush()
+            results.put(result)
+            if (result[0] <= target):
+                cancel.set() # no better solution can be found
+    except BaseException:
+        cancel.set()
+        results.put(WorkerError("multistart run failed in a worker:\n" +
+                                traceback.format_exc()))
+    finally:
+        results.put(None) # this worker is done
+
+# number of runs at once for n_starts seeds
+#   1 where worker processes cannot be forked
+def multistart_processes(n_starts, n_processes=None):
+    if (n_processes is None):
+        n_processes = multiprocessing.cpu_count()
+    n_processes = max(1, min(n_processes, n_starts))
+    if (not fork_available()):
+        return 1
+    return n_processes
+
+# run one seed per start, in up to n_processes worker processes
+#   returns list of run_once results (fewer than seeds if cancelled)
+def run_multistart(run_once, seeds, n_processes=None, target=0, best=None):
+    n_processes = multistart_processes(len(seeds), n_processes)
+    if (n_processes == 1):
+        # same semantics in this process
+        cancel = multiprocessing.Event()
+        results = []
+        random_state = random.getstate()
+        for seed in seeds:
+            random.seed(seed)
+            results.append(run_once(cancel))
+            if ((results[-1][0] <= target) or cancel.is_set()):
+                break # solved, or run_once asked to stop
+        random.setstate(random_state)
+        return results
+    context = multiprocessing.get_context("fork")
+    cancel = context.Event()
+    queue = context.Queue()
+    processes = []
+    for n_process in range(n_processes):
+        process = context.Process(target=multistart_worker,
+                                  args=(run_once, seeds[n_process::n_processes],
+                                        cancel, queue, target, best),
+                                  daemon=True)
+        process.start()
+        processes.append(process)
+    results, n_done, error = [], 0, None
+    while (n_done < n_processes):
+        if ((best is not None) and best.stop_requested):
+            cancel.set() # e.g. asked to stop by another thread
+        try:
+            result = queue.get(timeout=1.0)
+        except queue_module.Empty:
+            # a worker killed outright (e.g. by the os) never sends its None
+            for process in processes:
+                if ((process.exitcode is not None) and
+                    (process.exitcode != 0) and (error is None)):
+                    error = WorkerError("multistart worker died with exit "
+                                        "code " + str(process.exitcode))
+            if (error is not None):
+                cancel.set()
+                if (not any(process.is_alive() for process in processes)):
+                    break
+            continue
+        if (result is None):
+            n_done = n_done + 1
+        elif (isinstance(result, Improvement)):
+            best.improve(result.penalty, lambda: result.state)
+        elif (isinstance(result, WorkerError)):
+            cancel.set()
+            if (error is None):
+                error = result
+        else:
+            results.append(result)
+            if (result[0] <= target):
+                cancel.set()
+    for process in processes:
+        process.join()
+    if (error is not None):
+        raise error
+    return results
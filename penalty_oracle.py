@@ -0,0 +1,388 @@
+# reference-vs-fast penalty checks and microbenchmarks
+#   mcmc_penalty from both scripts (conference_annealing_sp20.py and
+#   conference_tempering_sp22.py) is the reference: it is called unchanged
+#   on the dictionaries from state.to_dicts(), quirks and all (each student
+#   is paired with themselves inside their group, the tempering version
+#   skips students with no prior associations, excluded questions are
+#   matched as substrings of the homework string), and every other scorer
+#   must return exactly the same integers
+#   a scorer is a class built as scorer(state, pairtable, questiontable),
+#   with .penalty, propose_move / propose_swap / propose_trade returning the
+#   change in penalty, and accept() applying the last proposal to the state
+#   (as GroupScorer in group_scoring.py); ChainScorer below wraps one chain
+#   of MultiChain (multichain.py), which has no trades
+#   check: random small classes with the odd cases mixed in (protected
+#   groups, empty and oversized groups, students with no history, prior
+#   partners who left the class, repeated partners), then random moves,
+#   swaps and trades, half of them accepted; each proposal is compared
+#   with the reference on a copy of the state with the move applied
+#   time: synthetic classes (see synthetic_class.py) across group counts
+#   and history depths; seconds per full penalty (reference call or scorer
+#   construction) and per proposal
+# usage:
+#   python penalty_oracle.py check --trials 200 --steps 200
+#   python penalty_oracle.py time --groups 5 20 100 --conferences 1 4 12
+#   failures = check_scorer(GroupScorer, n_trials=200)
+
+import sys
+import json
+import time
+import random
+import argparse
+import numpy
+import conference_annealing_sp20 as annealing
+import conference_tempering_sp22 as tempering
+from benchmark import class_inputs
+from group_scoring import GroupScorer, build_pair_table, build_question_table
+from group_state import GroupState
+from multichain import MultiChain
+from synthetic_class import make_class
+
+references = {"annealing": annealing.mcmc_penalty,
+              "tempering": tempering.mcmc_penalty}
+
+# one chain of MultiChain, with the same interface as GroupScorer
+#   the state is updated on accept(), as GroupScorer does
+class ChainScorer:
+    def __init__(self, state, pairtable, questiontable):
+        self.state = state
+        self.chains = MultiChain([state], pairtable, questiontable, seed=0)
+        self.column = {} # key = student index, value = column in the chain
+        for index in range(len(self.chains.students)):
+            self.column[int(self.chains.students[index])] = index
+        self.chain = numpy.zeros(1, dtype=numpy.int64)
+        self.penalty = int(self.chains.energies[0])
+        self.pending = None # last proposal, applied by accept()
+
+    def propose_move(self, student, group2):
+        column = self.column[student]
+        delta = int(self.chains.move_deltas(self.chain,
+                                            numpy.array([column]),
+                                            numpy.array([group2]))[0])
+        self.pending = ("move", student, group2, delta)
+        return delta
+
+    def propose_swap(self, group1, group2):
+        delta = int(self.chains.swap_deltas(self.chain,
+                                            numpy.array([group1]),
+                                            numpy.array([group2]))[0])
+        self.pending = ("swap", group1, group2, delta)
+        return delta
+
+    def accept(self):
+        if (self.pending is None):
+            return
+        move, first, second, delta = self.pending
+        chains, state = self.chains, self.state
+        if (move == "move"):
+            chains.apply_moves(self.chain, numpy.array([self.column[first]]),
+                               numpy.array([second]))
+            state.assignment[first] = second
+        else: # move == "swap"
+            chains.apply_swaps(self.chain, numpy.array([first]),
+                               numpy.array([second]))
+            (state.question[first],
+             state.question[second]) = state.question[second], state.question[first]
+        chains.energies[0] = chains.energies[0] + delta
+        self.penalty = self.penalty + delta
+        self.pending = None
+
+scorers = {"group": GroupScorer, "multichain": ChainScorer}
+
+# inputs for one random small class
+#   returns dict of the mcmc_penalty dictionaries, the tables and a state
+def random_case(rng):
+    studentids = list(range(1000, 1000 + rng.randint(5, 40)))
+    leftids = [studentid + 1000 for studentid in studentids[:3]]
+    # prior partners no longer in the class
+    n_groups = rng.randint(1, 9)
+    priorassociations, pastdict, excludehw = {}, {}, {}
+    for studentid in studentids:
+        priorassociations[studentid] = []
+        if (rng.random() < 0.8): # others have no history at all
+            for n_partner in range(rng.randint(0, 10)):
+                # includes repeats, themselves and students who left
+                priorassociations[studentid].append(rng.choice(studentids +
+                                                               leftids))
+        pastdict[studentid] = [rng.randint(1, 4)
+                               for n_question in range(rng.randint(0, 4))]
+        excludehw[studentid] = rng.choice(["0", "1", "3", "12", "23x", "x",
+                                           ""])
+    groups = {}
+    for groupid in rng.sample(range(1, 20), n_groups): # gaps in numbering
+        groups[groupid] = rng.randint(1, 4)
+    groupids = list(groups.keys())
+    n_protected = rng.randint(0, n_groups)
+    protected_groups, open_groups = {}, {}
+    for groupid in groupids[:n_protected]:
+        protected_groups[groupid] = groups[groupid]
+    for groupid in groupids[n_protected:]:
+        open_groups[groupid] = groups[groupid]
+    protected_assignments, open_assignments = {}, {}
+    for studentid in studentids:
+        if (rng.random() < 0.1):
+            continue # not being grouped
+        groupid = rng.choice(groupids)
+        if ((groupid in protected_groups) and (rng.random() < 0.5)):
+            protected_assignments[studentid] = groupid
+        else:
+            open_assignments[studentid] = groupid
+    pairtable = build_pair_table(studentids, priorassociations)
+    questiontable = build_question_table(pairtable[0], excludehw, pastdict,
+                                         groups.values())
+    state = GroupState(pairtable[0], protected_assignments, open_assignments,
+                       protected_groups, open_groups)
+    return {"priorassociations": priorassociations, "excludehw": excludehw,
+            "pastdict": pastdict, "pairtable": pairtable,
+            "questiontable": questiontable, "state": state}
+
+# penalty of a state from one reference
+def reference_penalty(reference, case, state):
+    new_assignments, new_groups = state.to_dicts()
+    return reference(case["priorassociations"], case["excludehw"],
+                     case["pastdict"], new_assignments, new_groups)
+
+# one random proposal, as (kind, first, second)
+#   kinds: "move" (student, group), "swap" (group, group) or
+#   "trade" (student, student)
+def random_proposal(rng, state, kinds):
+    kind = rng.choice(kinds)
+    if ((kind == "swap") and (len(state.groupids) > 1)):
+        group1, group2 = rng.sample(range(len(state.groupids)), 2)
+        return ("swap", group1, group2)
+    if ((kind == "trade") and (len(state.order) > 1)):
+        student1, student2 = rng.sample(list(state.order), 2)
+        return ("trade", student1, student2)
+    if (len(state.order) > 0):
+        return ("move", rng.choice(state.order),
+                rng.randrange(len(state.groupids)))
+    return None
+
+# copy of a state with one proposal applied
+def apply_proposal(state, proposal):
+    kind, first, second = proposal
+    state = state.copy()
+    if (kind == "move"):
+        state.assignment[first] = second
+    elif (kind == "swap"):
+        (state.question[first],
+         state.question[second]) = state.question[second], state.question[first]
+    else: # kind == "trade"
+        (state.assignment[first],
+         state.assignment[second]) = state.assignment[second], state.assignment[first]
+    return state
+
+# change in penalty from a scorer for one proposal
+def propose(scorer, proposal):
+    kind, first, second = proposal
+    if (kind == "move"):
+        return scorer.propose_move(first, second)
+    if (kind == "swap"):
+        return scorer.propose_swap(first, second)
+    return scorer.propose_trade(first, second)
+
+# compare a scorer with both references on random classes and proposals
+#   a trial stops at its first disagreement, since the states then differ
+#   returns list of failure descriptions, empty if the scorer agrees
+def check_scorer(scorer_class, n_trials=100, n_steps=200, seed=0):
+    kinds = ["move", "swap"]
+    if (hasattr(scorer_class, "propose_trade")):
+        kinds.append("trade")
+    failures = []
+    for trial in range(n_trials):
+        rng = random.Random(seed + trial)
+        case = random_case(rng)
+        state = case["state"]
+        scorer = scorer_class(state, case["pairtable"], case["questiontable"])
+        for step in range(n_steps + 1):
+            if (step == 0):
+                what, new_state, penalty = "start", state, scorer.penalty
+            else:
+                proposal = random_proposal(rng, state, kinds)
+                if (proposal is None):
+                    break # nobody to move
+                new_state = apply_proposal(state, proposal)
+                what = "{:s} {:d} {:d}".format(*proposal)
+                penalty = scorer.penalty + propose(scorer, proposal)
+            failure = None
+            for name in references:
+                expected = reference_penalty(references[name], case, new_state)
+                if (penalty != expected):
+                    failure = ("trial {:d} step {:d} ({:s}): scorer {:d}, "
+                               "{:s} reference {:d}").format(trial, step,
+                                                             what, penalty,
+                                                             name, expected)
+                    break
+            if ((failure is None) and (step > 0) and (rng.random() < 0.5)):
+                scorer.accept()
+                if ((state.assignment != new_state.assignment) or
+                    (state.question != new_state.question)):
+                    failure = ("trial {:d} step {:d} ({:s}): accept() did "
+                               "not apply the proposal").format(trial, step,
+                                                                what)
+                elif (scorer.penalty != penalty):
+                    failure = ("trial {:d} step {:d} ({:s}): penalty {:d} "
+                               "after accept(), expected {:d}").format(trial,
+                                                                       step,
+                                                                       what,
+                                                                       scorer.penalty,
+                                                                       penalty)
+            if (failure is not None):
+                failures.append(failure)
+                break
+    return failures
+
+# inputs for timing, from a synthetic class with n_groups groups of about
+#   5 and n_conferences of history
+#   students present in the new conference are spread at random over the
+#   groups, with questions 1 to 3 in turn
+def timing_case(n_groups, n_conferences, seed=0):
+    classdata = make_class(5 * n_groups, n_conferences, seed=seed)
+    (students, priorassociations, includegroup, excludehw, pastdict,
+     pairtable) = class_inputs(classdata)
+    rng = random.Random(seed)
+    open_groups = {}
+    for groupid in range(1, n_groups + 1):
+        open_groups[groupid] = (groupid - 1) % 3 + 1
+    present = [student[2] for student in students
+               if ((excludehw[student[2]] != "") and
+                   ("x" not in excludehw[student[2]]))]
+    rng.shuffle(present)
+    open_assignments = {}
+    for n_student in range(len(present)):
+        open_assignments[present[n_student]] = n_student % n_groups + 1
+    questiontable = build_question_table(pairtable[0], excludehw, pastdict,
+                                         open_groups.values())
+    state = GroupState(pairtable[0], {}, open_assignments, {}, open_groups)
+    return {"priorassociations": priorassociations, "excludehw": excludehw,
+            "pastdict": pastdict, "pairtable": pairtable,
+            "questiontable": questiontable, "state": state,
+            "students": len(present)}
+
+# seconds per call of a function, called once with each argument
+def seconds_per_call(function, arguments):
+    start_time = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - start_time) / max(1, len(arguments))
+
+# timings for one class
+#   returns list of result dicts, one per reference and scorer
+#   "full": seconds per penalty from scratch; "move", "swap", "trade":
+#   seconds per proposal (None where the scorer has none)
+def time_case(n_groups, n_conferences, n_calls, n_proposals, seed=0):
+    case = timing_case(n_groups, n_conferences, seed)
+    state = case["state"]
+    results = []
+    for name in references:
+        full = seconds_per_call(lambda n_call: reference_penalty(references[name],
+                                                                 case, state),
+                                range(n_calls))
+        results.append({"scorer": name + " reference", "full": full})
+    rng = random.Random(seed)
+    for name in scorers:
+        scorer_class = scorers[name]
+        result = {"scorer": name,
+                  "full": seconds_per_call(lambda n_call:
+                                           scorer_class(state,
+                                                        case["pairtable"],
+                                                        case["questiontable"]),
+                                           range(n_calls))}
+        scorer = scorer_class(state, case["pairtable"], case["questiontable"])
+        for kind in ["move", "swap", "trade"]:
+            result[kind] = None
+            if (not hasattr(scorer, "propose_" + kind)):
+                continue
+            proposals = [random_proposal(rng, state, [kind])
+                         for n_proposal in range(n_proposals)]
+            proposals = [proposal for proposal in proposals
+                         if ((proposal is not None) and (proposal[0] == kind))]
+            if (proposals):
+                result[kind] = seconds_per_call(lambda proposal:
+                                                propose(scorer, proposal),
+                                                proposals)
+        results.append(result)
+    for result in results:
+        result["groups"] = n_groups
+        result["conferences"] = n_conferences
+        result["students"] = case["students"]
+    return results
+
+# one line per result, e.g.
+#       20    4       95 group                  3.10e-03   1.20e-05   8.00e-06   2.10e-05
+def format_timing(result):
+    times = []
+    for key in ["full", "move", "swap", "trade"]:
+        if (result.get(key) is None):
+            times.append("{:>10s}".format("-"))
+        else:
+            times.append("{:10.2e}".format(result[key]))
+    return "{:6d} {:4d} {:8d} {:20s} {:s}".format(result["groups"],
+                                                result["conferences"],
+                                                result["students"],
+                                                result["scorer"],
+                                                " ".join(times))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check penalty scorers "
+                                     "against mcmc_penalty and time them.")
+    parser.add_argument("mode", nargs="?", choices=["check", "time", "all"],
+                        default="all")
+    parser.add_argument("--scorers", nargs="+", choices=list(scorers),
+                        default=list(scorers))
+    parser.add_argument("--trials", type=int, default=100,
+                        help="random classes to check")
+    parser.add_argument("--steps", type=int, default=200,
+                        help="proposals checked per class")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--groups", type=int, nargs="+",
+                        default=[5, 20, 100],
+                        help="group counts to time (about 5 students each)")
+    parser.add_argument("--conferences", type=int, nargs="+",
+                        default=[1, 4, 12],
+                        help="history depths to time")
+    parser.add_argument("--calls", type=int, default=20,
+                        help="full penalties timed per class")
+    parser.add_argument("--proposals", type=int, default=2000,
+                        help="proposals timed per class and kind")
+    parser.add_argument("--jsonl", help="also append timings to this file")
+    options = parser.parse_args(argv)
+    status = 0
+    if (options.mode in ["check", "all"]):
+        for name in options.scorers:
+            failures = check_scorer(scorers[name], options.trials,
+                                    options.steps, options.seed)
+            if (failures):
+                status = 1
+                print("{:s}: {:d} of {:d} trials disagree with "
+                      "mcmc_penalty".format(name, len(failures),
+                                            options.trials))
+                for failure in failures[:10]:
+                    print("  " + failure)
+            else:
+                print("{:s}: agrees with mcmc_penalty on {:d} trials of {:d} "
+                      "proposals".format(name, options.trials, options.steps))
+    if (options.mode in ["time", "all"]):
+        print("{:>6s} {:>4s} {:>8s} {:20s} {:>10s} {:>10s} {:>10s} "
+              "{:>10s}".format("groups", "conf", "students", "scorer",
+                               "full (s)", "move (s)", "swap (s)",
+                               "trade (s)"))
+        all_results = []
+        for n_groups in options.groups:
+            for n_conferences in options.conferences:
+                for result in time_case(n_groups, n_conferences,
+                                        options.calls, options.proposals,
+                                        options.seed):
+                    if ((result["scorer"] in scorers) and
+                        (result["scorer"] not in options.scorers)):
+                        continue
+                    print(format_timing(result))
+                    all_results.append(result)
+        if (options.jsonl is not None):
+            with open(options.jsonl, "a") as jsonlobject:
+                for result in all_results:
+                    jsonlobject.write(json.dumps(result) + "\n")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
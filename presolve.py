@@ -0,0 +1,83 @@
+# feasibility analysis and a lower bound on the penalty, before the mcmc
+#   the mcmc can only stop early at penalty 0, which some classes can never
+#   reach; the lower bound lets it stop as soon as nothing better is possible
+#   the bound adds up terms that no assignment can avoid:
+#     size: groups that must end up with fewer than 4 or more than 5
+#     members, given the number of students and the protected groups
+#     questions: each open student's cheapest question among the groups'
+#     questions; protected students keep their group's question
+#     pairs: prior partners who are protected in the same group
+#   it is a true lower bound but not always reachable, so it only ever
+#   shortens runs that could not have improved anyway
+# usage:
+#   lower_bound, notes = presolve(state, pairtable, questiontable)
+#   for note in notes: print(note)
+
+import math
+from group_scoring import max_exponent
+
+# number of groups that must be outside 4 to 5 members
+def min_size_violations(state):
+    n_groups = len(state.groupids)
+    protected_sizes = [0] * n_groups
+    open_students = set(state.open_students)
+    for student in state.order:
+        if (student not in open_students):
+            protected_sizes[state.assignment[student]] += 1
+    n_students = len(state.order)
+    n_oversized = 0 # already more than 5 protected members
+    for group in range(n_groups):
+        if (protected_sizes[group] > 5):
+            n_oversized = n_oversized + 1
+            n_students = n_students - protected_sizes[group]
+    n_groups = n_groups - n_oversized
+    n_violations = n_oversized
+    if ((n_oversized == 0) and (n_students > 5 * n_groups)):
+        n_violations = n_violations + 1 # one large group can take the rest
+        # (an already oversized group could take them at no extra cost)
+    elif (n_students < 4 * n_groups):
+        n_violations = n_violations + math.ceil((4 * n_groups - n_students) / 4)
+        # every group that is not short needs at least 4 of the students
+    return n_violations
+
+# lower bound on the penalty and notes on why it is above 0
+#   returns (lower_bound, list of strings)
+def presolve(state, pairtable, questiontable):
+    pair_weights = pairtable[2]
+    notes = []
+    n_violations = min_size_violations(state)
+    size_bound = n_violations * 2 ** max_exponent
+    if (n_violations > 0):
+        notes.append("{:d} of {:d} groups cannot have 4 or 5 members.".format(n_violations,
+                                                                            len(state.groupids)))
+    open_students = set(state.open_students)
+    questionids = sorted(set(state.question)) # questions being handed out
+    question_bound = 0
+    n_excluded = 0 # students with no question they can be given
+    for student in state.order:
+        if (student not in open_students):
+            cost = int(questiontable[student,
+                                     state.question[state.assignment[student]]])
+        elif (len(questionids) > 0):
+            cost = min(int(questiontable[student, questionid])
+                       for questionid in questionids)
+        else:
+            cost = 0
+        question_bound = question_bound + cost
+        if (cost >= 2 ** max_exponent):
+            n_excluded = n_excluded + 1
+    if (n_excluded > 0):
+        notes.append("{:d} students cannot avoid a question excluded by their homework.".format(n_excluded))
+    pair_bound = 0
+    protected = [student for student in state.order
+                 if (student not in open_students)]
+    for student in state.order:
+        pair_bound = pair_bound + int(pair_weights[student, student])
+    for student in protected:
+        for partner in protected:
+            if ((partner != student) and
+                (state.assignment[partner] == state.assignment[student])):
+                pair_bound = pair_bound + int(pair_weights[student, partner])
+    if (pair_bound > 0):
+        notes.append("Protected groups repeat prior partners.")
+    return (size_bound + question_bound + pair_bound, notes)
@@ -0,0 +1,63 @@
+# prior partners and questions from the conference history, in one pass
+#   students are bucketed by (conference, group) with one sort per
+#   conference, so every group is found whatever its number (gaps in the
+#   group numbers are fine) and each student is visited once per conference
+#   the pair counts go straight into the dense matrix used by the mcmc (see
+#   group_scoring.py); the lists with multiples are still returned for
+#   mcmc_penalty
+# usage:
+#   (associationsdict, questionsdict,
+#    pairtable) = build_associations(studentids, groups, questions)
+#   groups, questions: students x conferences, absent where not in a group
+#   (e.g. from ConferenceHistory, see conference_history.py)
+
+import numpy
+from group_scoring import pair_table_from_counts
+from conference_history import absent # no group in a conference
+
+# rows of the students in each group of one conference
+#   column: group of each student, absent if none
+#   returns list of index arrays, in group number order
+def conference_groups(column):
+    rows = numpy.flatnonzero(column != absent)
+    rows = rows[numpy.argsort(column[rows], kind="stable")]
+    bounds = numpy.flatnonzero(numpy.diff(column[rows])) + 1
+    if (len(rows) == 0):
+        return []
+    return numpy.split(rows, bounds)
+
+# prior associations and questions of each student
+#   studentids: one per row of groups and questions
+#   returns (associationsdict, questionsdict, pairtable)
+#   associationsdict: key = student id, value = list of prior partners,
+#   including multiples
+#   questionsdict: key = student id, value = list of prior questions
+#   pairtable: as from build_pair_table
+def build_associations(studentids, groups, questions):
+    studentindex = {}
+    for studentid in studentids:
+        if (studentid not in studentindex):
+            studentindex[studentid] = len(studentindex)
+    rows = numpy.array([studentindex[studentid] for studentid in studentids],
+                       dtype=numpy.int64) # matrix row of each history row
+    pair_counts = numpy.zeros((len(studentindex), len(studentindex)),
+                              dtype=numpy.int16)
+    associationsdict, questionsdict = {}, {}
+    for studentid in studentids:
+        associationsdict[studentid] = []
+        questionsdict[studentid] = []
+    for conference in range(groups.shape[1]):
+        for members in conference_groups(groups[:, conference]):
+            member_rows = rows[members]
+            pair_counts[numpy.ix_(member_rows, member_rows)] += 1
+            memberids = [studentids[member] for member in members.tolist()]
+            for member in members.tolist():
+                studentid = studentids[member]
+                associationsdict[studentid].extend(partnerid for partnerid
+                                                   in memberids
+                                                   if (partnerid != studentid))
+                questionsdict[studentid].append(int(questions[member,
+                                                              conference]))
+    numpy.fill_diagonal(pair_counts, 0) # not one's own partner
+    pairtable = pair_table_from_counts(studentindex, pair_counts)
+    return (associationsdict, questionsdict, pairtable)
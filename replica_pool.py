@@ -0,0 +1,110 @@
+# persistent worker processes for parallel tempering replicas
+#   each replica (GroupState) lives in its own process for the whole run
+#   workers are forked, so the read-only penalty tables are inherited once
+#   and shared copy-on-write instead of being pickled to every worker
+#   at each exchange only (temperature, energy, history) crosses the
+#   process boundary; a replica's state is sent back only when asked for
+#   with a BestState, each worker keeps the best state its replica has seen
+#   and reports its penalty after every run
+# usage:
+#   pool = ReplicaPool(anneal, states, depth, pairtable, questiontable,
+#                      track_penalties, selectors, lower_bound, deadline, best)
+#   results = pool.run(temperatures)
+#   # one (temp, energy, history, best penalty) per replica
+#   state = pool.state(index)
+#   best_state = pool.best_state(index)
+#   pool.close()
+
+import multiprocessing
+import random
+
+# whether worker processes can be forked on this platform
+def fork_available():
+    return ("fork" in multiprocessing.get_all_start_methods())
+
+# worker loop, one per replica
+#   messages: ("anneal", temperature), ("state",), ("best",), or None to stop
+#   best: this worker's copy of the parent's BestState, or None
+def replica_worker(connection, anneal, state, depth, pairtable,
+                   questiontable, track_penalties, selector, lower_bound,
+                   deadline, seed, best=None):
+    random.seed(seed) # independent random stream per replica
+    energy = None
+    while True:
+        message = connection.recv()
+        if (message is None):
+            break
+        if (message[0] == "anneal"):
+            output = anneal(message[1], energy, state, depth, pairtable,
+                            questiontable, track_penalties, selector,
+                            lower_bound, deadline, best)
+            # returns: temp, energy, state, depth, history
+            energy = output[1]
+            if (best is not None):
+                best_penalty = best.penalty
+            else:
+                best_penalty = None
+            connection.send((output[0], output[1], output[4], best_penalty))
+        elif (message[0] == "best"):
+            connection.send(best.state)
+        else: # message[0] == "state"
+            connection.send(state)
+    connection.close()
+
+class ReplicaPool:
+    def __init__(self, anneal, states, depth, pairtable, questiontable,
+                 track_penalties, selectors=None, lower_bound=0,
+                 deadline=None, best=None):
+        # selectors: optional MoveSelector per replica, kept in its worker
+        # lower_bound: replicas stop annealing once they reach it
+        # deadline: optional time.monotonic() time to stop annealing by
+        # best: optional BestState; each worker gets its own copy, which
+        #   sees the parent's stop_requested only if set before the fork
+        #   (a SIGINT reaches the workers directly, see best_state.py)
+        context = multiprocessing.get_context("fork")
+        self.connections, self.processes = [], []
+        if (selectors is None):
+            selectors = [None] * len(states)
+        for state, selector in zip(states, selectors):
+            parent_connection, child_connection = context.Pipe()
+            seed = random.getrandbits(32) # reproducible from parent seed
+            process = context.Process(target=replica_worker,
+                                      args=(child_connection, anneal, state,
+                                            depth, pairtable, questiontable,
+                                            track_penalties, selector,
+                                            lower_bound, deadline, seed,
+                                            best),
+                                      daemon=True)
+            process.start()
+            child_connection.close()
+            self.connections.append(parent_connection)
+            self.processes.append(process)
+
+    # anneal every replica at its temperature, all at once
+    #   returns list of (temperature, energy, history, best penalty), in
+    #   replica order; best penalty is None without a BestState
+    def run(self, temperatures):
+        for connection, temperature in zip(self.connections, temperatures):
+            connection.send(("anneal", temperature))
+        return [connection.recv() for connection in self.connections]
+
+    # current state of one replica
+    def state(self, index):
+        self.connections[index].send(("state",))
+        return self.connections[index].recv()
+
+    # lowest penalty state one replica has seen (needs a BestState)
+    def best_state(self, index):
+        self.connections[index].send(("best",))
+        return self.connections[index].recv()
+
+    # stop all workers
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass # worker already gone
+            connection.close()
+        for process in self.processes:
+            process.join()
@@ -0,0 +1,149 @@
+# synthetic classes, for measuring the solvers without real student data
+#   a class has a roster, n_conferences prior conferences and a homework
+#   file for each of them plus one more, so the next run creates groups for
+#   conference n_conferences + 1
+#   each conference puts the students who came (about 95%) into groups of
+#   4 or 5, numbered from 1, with questions 1 to 3 spread evenly; homework
+#   marks a few questions as not completed and a few students as absent (x)
+#   everything is drawn from one random.Random(seed), so a class is
+#   reproducible; last and first names repeat, as in real rosters, but no
+#   two students share both (the readable file tells students apart by
+#   their first initials)
+# usage:
+#   classdata = make_class(200, 4, seed=1)
+#   write_class("astr900/", "900", classdata)
+#   python synthetic_class.py astr900/ --students 200 --conferences 4
+
+import os
+import sys
+import math
+import random
+import argparse
+
+lastname_pool = ["Garcia", "Smith", "Nguyen", "Johnson", "Kim", "Patel",
+                 "Brown", "Lee", "Martinez", "Williams", "Chen", "Davis",
+                 "Lopez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore",
+                 "Jackson", "Hernandez", "Wang", "Clark", "Lewis", "Young"]
+firstname_pool = ["Alex", "Jordan", "Taylor", "Sam", "Maria", "Jose", "Wei",
+                  "Priya", "Emily", "Michael", "Sarah", "David", "Ana",
+                  "Daniel", "Grace", "Kevin", "Laura", "Omar", "Nina",
+                  "Ryan", "Sofia", "Tyler", "Yuki", "Zoe"]
+
+# one synthetic class, in memory
+#   returns dict:
+#     "students": list of [lastname, firstname, id]
+#     "conferences": list of (ids, groups, questions), one per conference
+#     "homework": list of (ids, excluded strings), one per homework
+def make_class(n_students, n_conferences, seed=0, attendance=0.95,
+               absent_fraction=0.05):
+    rng = random.Random(seed)
+    ids = rng.sample(range(100000, 1000000), n_students)
+    students, names = [], set()
+    for studentid in ids:
+        name = None
+        while ((name is None) or (name in names)):
+            lastname = rng.choice(lastname_pool)
+            if (rng.random() < 0.2): # enough names for large classes
+                lastname = lastname + "-" + rng.choice(lastname_pool)
+            name = (lastname, rng.choice(firstname_pool))
+        names.add(name)
+        students.append([name[0], name[1], studentid])
+    conferences = []
+    for n_conference in range(n_conferences):
+        present = [studentid for studentid in ids
+                   if (rng.random() < attendance)]
+        rng.shuffle(present)
+        n_groups = max(1, math.ceil(len(present) / 5))
+        questions = [n_group % 3 + 1 for n_group in range(n_groups)]
+        rng.shuffle(questions)
+        groups = [n_student % n_groups + 1
+                  for n_student in range(len(present))]
+        conferences.append((present, groups,
+                            [questions[groupid - 1] for groupid in groups]))
+    homework = []
+    for n_homework in range(n_conferences + 1):
+        excluded = []
+        for studentid in ids:
+            excludedstr = rng.choice(["0"] * 12 + ["1", "2", "3", "12",
+                                                   "23", "13"])
+            if (rng.random() < absent_fraction):
+                excludedstr = excludedstr + "x"
+            excluded.append(excludedstr)
+        homework.append((list(ids), excluded))
+    return {"students": students, "conferences": conferences,
+            "homework": homework}
+
+# write a class made by make_class to its directory
+#   returns list of files written
+def write_class(rosterpath, userclass, classdata):
+    if (not (rosterpath.endswith("/"))):
+        rosterpath = rosterpath + "/"
+    os.makedirs(rosterpath, exist_ok=True)
+    prefix = rosterpath + "astr" + userclass
+    names = {}
+    for lastname, firstname, studentid in classdata["students"]:
+        names[studentid] = (lastname, firstname)
+    filenames = [prefix + "_roster_conferences_csv.csv"]
+    with open(filenames[-1], "w") as rosterobject:
+        rosterobject.write("# lastname, firstname, id\n")
+        for lastname, firstname, studentid in classdata["students"]:
+            rosterobject.write("\"{:s}\", \"{:s}\", {:d}\n".format(lastname,
+                                                                  firstname,
+                                                                  studentid))
+    for n_conference in range(len(classdata["conferences"])):
+        ids, groups, questions = classdata["conferences"][n_conference]
+        grouped = dict(zip(ids, zip(groups, questions)))
+        filenames.append(prefix + "_conf" + str(n_conference + 1) + ".csv")
+        with open(filenames[-1], "w") as conferenceobject:
+            for lastname, firstname, studentid in classdata["students"]:
+                if (studentid in grouped):
+                    groupid, questionid = grouped[studentid]
+                    write_str = "{:s}, {:s}, {:d}, {:d}, {:d}\n".format(lastname,
+                                                                        firstname,
+                                                                        studentid,
+                                                                        groupid,
+                                                                        questionid)
+                else:
+                    write_str = "{:s}, {:s}, {:d}, , \n".format(lastname,
+                                                               firstname,
+                                                               studentid)
+                conferenceobject.write(write_str)
+    for n_homework in range(len(classdata["homework"])):
+        ids, excluded = classdata["homework"][n_homework]
+        filenames.append(prefix + "_hw" + str(n_homework + 1) + ".csv")
+        with open(filenames[-1], "w") as homeworkobject:
+            for studentid, excludedstr in zip(ids, excluded):
+                lastname, firstname = names[studentid]
+                homeworkobject.write("{:s}, {:s}, {:d}, {:s}\n".format(lastname,
+                                                                      firstname,
+                                                                      studentid,
+                                                                      excludedstr))
+    return filenames
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic class "
+                                     "directory for testing and benchmarks.")
+    parser.add_argument("directory", help="class directory, e.g. astr900/")
+    parser.add_argument("--class", dest="userclass",
+                        help="class name (default: from the directory)")
+    parser.add_argument("--students", type=int, default=100,
+                        help="number of students (20 to 5000)")
+    parser.add_argument("--conferences", type=int, default=4,
+                        help="number of prior conferences")
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args(argv)
+    if ((options.students < 20) or (options.students > 5000)):
+        parser.error("--students must be between 20 and 5000")
+    userclass = options.userclass
+    if (userclass is None):
+        from batch import class_name
+        userclass = class_name(options.directory)
+    classdata = make_class(options.students, options.conferences,
+                           options.seed)
+    filenames = write_class(options.directory, userclass, classdata)
+    print("Wrote {:d} files for class {:s}.".format(len(filenames),
+                                                    userclass))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())